@@ -0,0 +1,112 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+from time import sleep
+
+from . import constants
+from .compat import monotonic
+from .endpoint import APIEndpoint
+from .models import BulkStatus
+
+try:
+    from typing import TYPE_CHECKING
+    if TYPE_CHECKING:
+        from typing import Any, Callable, Dict, Optional, Text
+        from .client import NuxeoClient
+except ImportError:
+    pass
+
+
+class API(APIEndpoint):
+    """
+    Endpoint for the Bulk Action Framework: an action is applied by the
+    server to all documents matching a NXQL query.
+
+        >>> status = nuxeo.bulk.run(
+        ...     'setProperties',
+        ...     "SELECT * FROM File WHERE ecm:path STARTSWITH '/foo'",
+        ...     params={'dc:description': 'bar'})
+        >>> status.wait()
+    """
+    def __init__(self, client, endpoint='bulk', headers=None):
+        # type: (NuxeoClient, Text, Optional[Dict[Text, Text]]) -> None
+        super(API, self).__init__(
+            client, endpoint=endpoint, cls=BulkStatus, headers=headers)
+
+    def get(self, command_id):
+        # type: (Text) -> BulkStatus
+        """
+        Get the status of a bulk command.
+
+        :param command_id: the id of the command
+        :return: the status
+        """
+        return super(API, self).get(path=command_id)
+
+    def post(self, **kwargs):
+        # type: (Any) -> None
+        raise NotImplementedError()
+
+    def put(self, **kwargs):
+        # type: (Any) -> None
+        raise NotImplementedError()
+
+    def delete(self, command_id):
+        # type: (Text) -> None
+        raise NotImplementedError()
+
+    def run(self, action, query, params=None):
+        # type: (Text, Text, Optional[Dict[Text, Any]]) -> BulkStatus
+        """
+        Submit a bulk command.
+
+        :param action: the action to run, e.g. 'setProperties' or 'trash'
+        :param query: the NXQL query selecting the documents
+        :param params: the parameters of the action
+        :return: the status of the submitted command
+        """
+        path = '{}/search/bulk/{}'.format(self.client.api_path, action)
+        response = self.client.request(
+            'POST', path, data=params or {}, params={'query': query})
+        return BulkStatus.parse(response.json(), service=self)
+
+    def abort(self, command_id):
+        # type: (Text) -> BulkStatus
+        """
+        Abort a bulk command.
+
+        :param command_id: the id of the command
+        :return: the status of the command
+        """
+        path = '{}/{}/abort'.format(self.endpoint, command_id)
+        response = self.client.request('PUT', path)
+        return BulkStatus.parse(response.json(), service=self)
+
+    def wait(
+        self,
+        status,  # type: BulkStatus
+        timeout=None,  # type: Optional[float]
+        callback=None,  # type: Optional[Callable[[BulkStatus], Any]]
+    ):
+        # type: (...) -> bool
+        """
+        Wait for a bulk command to be done, refreshing its status less
+        and less often.
+
+        :param status: the status of the command, refreshed in place
+        :param timeout: the maximum time to wait, in seconds
+        :param callback: if set, called with the status after each refresh
+        :return: True if the command is done, False on timeout
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        delay = constants.ASYNC_POLL_DELAY
+        while not status.is_done:
+            if deadline is not None and monotonic() + delay > deadline:
+                return False
+            sleep(delay)
+            delay = min(delay * 2, constants.ASYNC_POLL_MAX_DELAY)
+
+            status.load()
+            if callable(callback):
+                callback(status)
+        return True
@@ -0,0 +1,425 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import base64
+import copy
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from threading import RLock
+
+from .compat import get_bytes, get_text, monotonic, replace
+from .constants import CACHE_SIZE, CACHE_TTL
+from .models import Document
+
+try:
+    from typing import TYPE_CHECKING
+    if TYPE_CHECKING:
+        from typing import (Any, Dict, Hashable, List, Optional, Text,
+                            Tuple)
+except ImportError:
+    pass
+
+
+class LRUCache(object):
+    """
+    Thread-safe mapping keeping at most `maxsize` entries, the least
+    recently used ones being evicted first.  When `ttl` is set, entries
+    older than `ttl` seconds are considered missing.
+
+    :param maxsize: the maximum number of entries
+    :param ttl: the lifetime of an entry, in seconds
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        # type: (int, Optional[float]) -> None
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # type: OrderedDict
+        self._lock = RLock()
+
+    def __contains__(self, key):
+        # type: (Hashable) -> bool
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._data)
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} size={}/{} ttl={!r} hits={} misses={}>'.format(
+            type(self).__name__, len(self), self.maxsize, self.ttl,
+            self.hits, self.misses)
+
+    @property
+    def stats(self):
+        # type: () -> Dict[Text, int]
+        """ Statistics about the cache usage. """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self),
+        }
+
+    def get(self, key, default=None):
+        # type: (Hashable, Any) -> Any
+        """ Get the value of an entry, marking it as recently used. """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # Move the entry at the end: it is now the most recently used
+            del self._data[key]
+            self._data[key] = entry
+            return entry[1]
+
+    def set(self, key, value):
+        # type: (Hashable, Any) -> None
+        """ Add or replace an entry, evicting the oldest ones if needed. """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (monotonic(), value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        # type: (Hashable, Any) -> Any
+        """ Remove an entry and return its value. """
+        with self._lock:
+            entry = self._lookup(key)
+            self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def keys(self):
+        # type: () -> List[Hashable]
+        """ Return the keys of the entries, including expired ones. """
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        # type: () -> None
+        """ Remove all entries. """
+        with self._lock:
+            self._data.clear()
+
+    def _lookup(self, key):
+        # type: (Hashable) -> Optional[tuple]
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if self.ttl is not None and monotonic() - entry[0] > self.ttl:
+            del self._data[key]
+            return None
+        return entry
+
+
+class DiskCache(object):
+    """
+    Persistent mapping storing each entry as a JSON file in `directory`.
+
+    Keys are hashed to build the file names.  Values must be JSON
+    serializable, except for bytes stored under the 'content' key of
+    a dict, which are base64-encoded.  It can be used as HTTP cache
+    storage, see :class:`nuxeo.client.NuxeoClient`.
+
+    :param directory: where to store the entries
+    """
+
+    def __init__(self, directory):
+        # type: (Text) -> None
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} directory={!r} hits={} misses={}>'.format(
+            type(self).__name__, self.directory, self.hits, self.misses)
+
+    def get(self, key, default=None):
+        # type: (Text, Any) -> Any
+        """ Get the value of an entry. """
+        try:
+            with open(self._file(key), 'rb') as f:
+                value = json.loads(get_text(f.read()))
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        if isinstance(value, dict) and 'content' in value:
+            value['content'] = base64.b64decode(value['content'])
+        return value
+
+    def set(self, key, value):
+        # type: (Text, Any) -> None
+        """ Add or replace an entry. """
+        if isinstance(value, dict) and 'content' in value:
+            value = dict(value)
+            value['content'] = get_text(base64.b64encode(value['content']))
+
+        # Write in a temporary file first to never expose partial entries,
+        # one per call as several threads may set the same key
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(get_bytes(json.dumps(value)))
+            replace(tmp, self._file(key))
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def pop(self, key, default=None):
+        # type: (Text, Any) -> Any
+        """ Remove an entry and return its value. """
+        value = self.get(key, default=default)
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+        return value
+
+    def clear(self):
+        # type: () -> None
+        """ Remove all entries. """
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
+
+    def _file(self, key):
+        # type: (Text) -> Text
+        name = hashlib.sha1(get_bytes(key)).hexdigest()
+        return os.path.join(self.directory, name + '.json')
+
+
+class DocumentCache(object):
+    """
+    Cache of documents, reachable by uid and by path.
+
+    A document is stored under both keys, as a snapshot of its JSON
+    representation: each hit returns a new document, so that changes
+    made by a caller to its copy are not seen by the others.  Documents
+    seen in other
+    responses, such as queries or children listings, replace the cached
+    ones when their `changeToken` differs, such entries being counted
+    as stale.
+
+    The same document fetched with other settings, like another
+    repository or other schemas, is a different document: such settings
+    are given as the `scope` of each call.
+
+    :param maxsize: the maximum number of documents
+    :param ttl: the lifetime of a document, in seconds
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        # type: (int, Optional[float]) -> None
+        # Each document takes two entries: one per uid, one per path
+        self._docs = LRUCache(maxsize=maxsize * 2, ttl=ttl)
+        self._lock = RLock()
+        self.stale = 0
+
+    def __len__(self):
+        # type: () -> int
+        return len([key for key in self._docs.keys() if key[0] == 'uid'])
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} size={} hits={} misses={} stale={}>'.format(
+            type(self).__name__, len(self), self._docs.hits,
+            self._docs.misses, self.stale)
+
+    @property
+    def stats(self):
+        # type: () -> Dict[Text, int]
+        """ Statistics about the cache usage. """
+        stats = self._docs.stats
+        stats.update({'size': len(self), 'stale': self.stale})
+        return stats
+
+    def get(
+        self,
+        uid=None,  # type: Optional[Text]
+        path=None,  # type: Optional[Text]
+        scope=None,  # type: Hashable
+    ):
+        # type: (...) -> Optional[Document]
+        """ Get a copy of a cached document by its uid or its path. """
+        if uid:
+            return self._restore(self._docs.get(('uid', scope, uid)))
+
+        entry = self._docs.get(('path', scope, path))
+        if entry is not None and entry[0].get('path') != path:
+            # The document has been renamed or moved in the meantime
+            self._docs.pop(('path', scope, path))
+            return None
+        return self._restore(entry)
+
+    def add(self, doc, scope=None):
+        # type: (Document, Hashable) -> None
+        """ Cache a document fetched from the server. """
+        if not doc.uid:
+            return
+
+        entry = (copy.deepcopy(doc.as_dict()), doc.service)
+        with self._lock:
+            cached = self._docs.pop(('uid', scope, doc.uid))
+            if cached is not None and cached[0].get('path') != doc.path:
+                self._docs.pop(('path', scope, cached[0].get('path')))
+
+            self._docs.set(('uid', scope, doc.uid), entry)
+            if doc.path:
+                self._docs.set(('path', scope, doc.path), entry)
+
+    def refresh(self, doc, scope=None):
+        # type: (Document, Hashable) -> None
+        """ Replace a cached document if this one is more recent. """
+        with self._lock:
+            cached = self._docs.pop(('uid', scope, doc.uid))
+            if cached is None:
+                return
+            if cached[0].get('changeToken') == doc.changeToken:
+                self._docs.set(('uid', scope, doc.uid), cached)
+            else:
+                self.add(doc, scope=scope)
+                self.stale += 1
+
+    def discard(self, uid):
+        # type: (Text) -> None
+        """
+        Remove a document from the cache, whatever its scope, as well as
+        all cached documents below it, as their paths may have changed.
+        """
+        with self._lock:
+            for key in self._docs.keys():
+                if key[0] != 'uid' or key[2] != uid:
+                    continue
+                entry = self._docs.pop(key)
+                path = entry[0].get('path') if entry is not None else None
+                if not path:
+                    continue
+
+                scope = key[1]
+                self._docs.pop(('path', scope, path))
+                prefix = path.rstrip('/') + '/'
+                for child_key in self._docs.keys():
+                    if (child_key[0] != 'path' or child_key[1] != scope
+                            or not child_key[2].startswith(prefix)):
+                        continue
+                    child = self._docs.pop(child_key)
+                    if child is not None:
+                        self._docs.pop(('uid', scope, child[0].get('uid')))
+
+    def clear(self):
+        # type: () -> None
+        """ Remove all documents. """
+        self._docs.clear()
+
+    @staticmethod
+    def _restore(entry):
+        # type: (Optional[Tuple[Dict[Text, Any], Any]]) -> Optional[Document]
+        """ Build a new document from a cached snapshot. """
+        if entry is None:
+            return None
+        data, service = entry
+        return Document.parse(copy.deepcopy(data), service=service)
+
+
+class PathCache(object):
+    """
+    Mapping of documents paths to their uid, so that documents addressed
+    by path can be fetched by uid, sparing the path resolution on the
+    server.  Moving or removing a document also forgets the paths of
+    all documents below it.
+
+    Paths of different repositories are kept apart by the `scope` of
+    each call.
+
+    :param maxsize: the maximum number of paths
+    :param ttl: the lifetime of a path, in seconds
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        # type: (int, Optional[float]) -> None
+        self._uids = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._paths = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._lock = RLock()
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._uids)
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} size={} hits={} misses={}>'.format(
+            type(self).__name__, len(self), self._uids.hits,
+            self._uids.misses)
+
+    @property
+    def stats(self):
+        # type: () -> Dict[Text, int]
+        """ Statistics about the cache usage. """
+        return self._uids.stats
+
+    def get(self, path, scope=None):
+        # type: (Text, Hashable) -> Optional[Text]
+        """ Get the uid of the document at the given path. """
+        return self._uids.get((scope, self._normalize(path)))
+
+    def add(self, path, uid, scope=None):
+        # type: (Optional[Text], Optional[Text], Hashable) -> None
+        """ Remember the uid of the document at the given path. """
+        if not path or not uid:
+            return
+
+        path = self._normalize(path)
+        with self._lock:
+            previous = self._paths.pop((scope, uid))
+            if previous is not None and previous != path:
+                self._uids.pop((scope, previous))
+            self._uids.set((scope, path), uid)
+            self._paths.set((scope, uid), path)
+
+    def discard(self, uid, scope=None):
+        # type: (Text, Hashable) -> None
+        """ Forget the path of a document and of all documents below it. """
+        with self._lock:
+            path = self._paths.pop((scope, uid))
+            if path is None:
+                return
+
+            self._uids.pop((scope, path))
+            prefix = path.rstrip('/') + '/'
+            for key in self._uids.keys():
+                if key[0] == scope and key[1].startswith(prefix):
+                    child = self._uids.pop(key)
+                    if child is not None:
+                        self._paths.pop((scope, child))
+
+    def clear(self):
+        # type: () -> None
+        """ Forget all paths. """
+        with self._lock:
+            self._uids.clear()
+            self._paths.clear()
+
+    @staticmethod
+    def _normalize(path):
+        # type: (Text) -> Text
+        return path.rstrip('/') or '/'
@@ -0,0 +1,189 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from .constants import QUERY_PAGE_SIZE
+
+try:
+    from typing import TYPE_CHECKING
+    if TYPE_CHECKING:
+        from typing import Any, Dict, Iterator, List, Optional, Text
+        from .operations import API as OperationsAPI
+except ImportError:
+    pass
+
+# A change on a document: `kind` is one of 'created', 'modified',
+# 'moved' or 'deleted', `path` is the path after the change
+Change = namedtuple(
+    'Change', ['kind', 'uid', 'path', 'type', 'event', 'date', 'log_id'])
+
+# The kind of change of each audited event
+EVENTS = {
+    'documentCreated': 'created',
+    'documentCreatedByCopy': 'created',
+    'documentDuplicated': 'created',
+    'documentUntrashed': 'created',
+    'documentModified': 'modified',
+    'documentCheckedIn': 'modified',
+    'documentLocked': 'modified',
+    'documentUnlocked': 'modified',
+    'documentRestored': 'modified',
+    'documentSecurityUpdated': 'modified',
+    'lifecycle_transition_event': 'modified',
+    'documentMoved': 'moved',
+    'documentRemoved': 'deleted',
+    'documentTrashed': 'deleted',
+}  # type: Dict[Text, Text]
+
+
+class ChangeFeed(object):
+    """
+    Incremental feed of the changes made on documents, read from the
+    audit log.
+
+    The feed remembers the id of the last log entry it returned, its
+    cursor, and only asks for newer entries.  Entries are fetched page
+    by page, so that memory stays bounded whatever the number of
+    changes.  When a `store` is given, such as
+    :class:`nuxeo.cache.DiskCache`, the cursor is saved there and the
+    next feed created with the same store resumes where this one
+    stopped:
+
+        >>> feed = nuxeo.documents.change_feed(
+        ...     root='/default-domain/workspaces', store=DiskCache(path))
+        >>> for change in feed.poll():
+        ...     print(change.kind, change.uid, change.path)
+
+    A new feed without saved cursor starts from the latest entry, the
+    initial state having to be loaded separately.
+
+    As the path of a change is the path after it, moves are returned
+    whatever their path: a document moved out of `root` is only known
+    from its new path, outside of it.
+
+    :param operations: the operations endpoint
+    :param root: if set, only changes below this path, and moves, are
+                 returned
+    :param store: where to save the cursor, anything with get() and
+                  set() methods
+    :param page_size: the number of log entries fetched per request
+    """
+
+    def __init__(
+        self,
+        operations,  # type: OperationsAPI
+        root=None,  # type: Optional[Text]
+        store=None,  # type: Any
+        page_size=QUERY_PAGE_SIZE,  # type: int
+    ):
+        # type: (...) -> None
+        self.operations = operations
+        self.root = root.rstrip('/') if root else None
+        self.store = store
+        self.page_size = page_size
+        self._cursor = None  # type: Optional[int]
+        if store is not None:
+            self._cursor = store.get(self._store_key)
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} root={!r} cursor={!r}>'.format(
+            type(self).__name__, self.root, self._cursor)
+
+    @property
+    def cursor(self):
+        # type: () -> Optional[int]
+        """ The id of the last log entry returned. """
+        return self._cursor
+
+    @cursor.setter
+    def cursor(self, value):
+        # type: (Optional[int]) -> None
+        self._cursor = value
+        if self.store is not None:
+            self.store.set(self._store_key, value)
+
+    @property
+    def _store_key(self):
+        # type: () -> Text
+        client = self.operations.client
+        return 'changes:{}:{}:{}'.format(
+            client.host, client.repository, self.root or '')
+
+    def poll(self):
+        # type: () -> Iterator[Change]
+        """
+        Yield the changes made since the cursor, oldest first.  The
+        cursor is saved after each page, as well as when the iteration
+        is stopped early: a change whose processing was interrupted
+        is returned again by the next poll.
+        """
+        if self._cursor is None:
+            self.reset()
+
+        cursor = self._cursor
+        try:
+            while True:
+                entries = self._fetch(cursor)
+                for entry in entries:
+                    change = self._parse(entry)
+                    if change:
+                        yield change
+                    # Only now the change is known to be processed
+                    cursor = entry['id']
+                if cursor != self._cursor:
+                    self.cursor = cursor
+                if len(entries) < self.page_size:
+                    break
+        finally:
+            if cursor != self._cursor:
+                self.cursor = cursor
+
+    def reset(self):
+        # type: () -> None
+        """ Move the cursor to the latest log entry. """
+        query = 'FROM LogEntry log ORDER BY log.id DESC'
+        entries = self.operations.execute(
+            command='Audit.Query', params={'query': query, 'maxResults': 1})
+        self.cursor = entries[0]['id'] if entries else 0
+
+    def _fetch(self, cursor):
+        # type: (int) -> List[Dict[Text, Any]]
+        """ Fetch a page of log entries newer than the cursor. """
+        clauses = [
+            'log.id > {}'.format(int(cursor)),
+            "log.category = 'eventDocumentCategory'",
+            'log.repositoryId = {}'.format(
+                self._quote(self.operations.client.repository)),
+            'log.eventId IN ({})'.format(
+                ', '.join(self._quote(event) for event in sorted(EVENTS))),
+        ]
+        if self.root:
+            clauses.append(
+                '(log.eventId = {} OR log.docPath = {} '
+                'OR log.docPath LIKE {})'.format(
+                    self._quote('documentMoved'), self._quote(self.root),
+                    self._quote(self.root + '/%')))
+
+        query = 'FROM LogEntry log WHERE {} ORDER BY log.id'.format(
+            ' AND '.join(clauses))
+        return self.operations.execute(
+            command='Audit.Query',
+            params={'query': query, 'maxResults': self.page_size})
+
+    @staticmethod
+    def _parse(entry):
+        # type: (Dict[Text, Any]) -> Optional[Change]
+        kind = EVENTS.get(entry.get('eventId'))
+        if not kind:
+            return None
+        return Change(kind, entry.get('docUUID'), entry.get('docPath'),
+                      entry.get('docType'), entry['eventId'],
+                      entry.get('eventDate'), entry['id'])
+
+    @staticmethod
+    def _quote(value):
+        # type: (Text) -> Text
+        """ Quote a string for a JPA query. """
+        return "'{}'".format(value.replace("'", "''"))
@@ -2,19 +2,21 @@
 from __future__ import unicode_literals
 
 import atexit
+import hashlib
 import json
 import logging
 
 import requests
+from requests.structures import CaseInsensitiveDict
 
-from . import (__version__, directories, documents, groups,
+from . import (__version__, bulk, directories, documents, groups,
                operations, tasks, uploads, users, workflows)
 from .auth import TokenAuth
-from .compat import text
+from .compat import get_bytes, get_text, text
 from .constants import (CHUNK_SIZE, DEFAULT_API_PATH, DEFAULT_APP_NAME,
                         DEFAULT_URL)
 from .exceptions import BadQuery, HTTPError, Unauthorized
-from .utils import json_helper
+from .utils import SingleFlight, json_helper
 
 try:
     from typing import TYPE_CHECKING
@@ -36,6 +38,8 @@ class NuxeoClient(object):
     :param host: The url of the Nuxeo Platform
     :param api_path: The API path appended to the host url
     :param chunk_size: The size of the chunks for blob download
+    :param http_cache: If set, the storage used to cache GET responses,
+        e.g. :class:`nuxeo.cache.LRUCache` or :class:`nuxeo.cache.DiskCache`
     :param kwargs: kwargs passed to :func:`NuxeoClient.request`
     """
 
@@ -61,8 +65,10 @@ class NuxeoClient(object):
             'User-Agent': app_name + '/' + version,
             'Accept': 'application/json, */*'
         }
-        self.schemas = kwargs.get('schemas', '*')
+        self.schemas = kwargs.pop('schemas', '*')
         self.repository = kwargs.pop('repository', 'default')
+        self.http_cache = kwargs.pop('http_cache', None)
+        self.single_flight = SingleFlight()
         self._session = requests.session()
         cookies = kwargs.pop('cookies', None)
         if cookies:
@@ -146,7 +152,15 @@ class NuxeoClient(object):
         :param data: data to put in the body
         :param raw: if True, don't parse the data to JSON
         :param kwargs: other parameters accepted by
-               :func:`requests.request`
+               :func:`requests.request`, and these ones shaping the
+               documents sent by the server:
+
+               - `schemas`: the schemas of the properties to fetch,
+                 instead of the client ones
+               - `fetch`: the document parts to load, e.g. ['lock']
+               - `depth`: how deep to resolve references, one of
+                 'root', 'children' or 'max'
+               - `enrichers`: the document enrichers to use
         :return: the HTTP response
         """
         if method not in ('GET', 'HEAD', 'POST', 'PUT',
@@ -164,13 +178,22 @@ class NuxeoClient(object):
         if 'Content-Type' not in headers:
             headers['Content-Type'] = kwargs.pop(
                 'content_type', 'application/json')
+        schemas = kwargs.pop('schemas', None) or self.schemas
+        if isinstance(schemas, list):
+            schemas = ','.join(schemas)
         headers.update({
-            'X-NXDocumentProperties': self.schemas,
+            'X-NXDocumentProperties': schemas,
             'X-NXRepository': self.repository
         })
         enrichers = kwargs.pop('enrichers', None)
         if enrichers:
             headers['X-NXenrichers.document'] = ', '.join(enrichers)
+        fetch = kwargs.pop('fetch', None)
+        if fetch:
+            headers['X-NXfetch.document'] = ', '.join(fetch)
+        depth = kwargs.pop('depth', None)
+        if depth:
+            headers['depth'] = depth
 
         headers.update(self.headers)
 
@@ -181,6 +204,21 @@ class NuxeoClient(object):
         # to set `default` to `None`.
         default = kwargs.pop('default', object)
 
+        cache_key = cached = None
+        if method == 'GET' and self.http_cache is not None:
+            cache_key = self._cache_key(url, headers, kwargs.get('params'))
+            try:
+                cached = self.http_cache.get(cache_key)
+            except Exception:
+                # The cache is an optimization, never fail the request
+                logger.warning('Cannot read the HTTP cache', exc_info=True)
+            if cached:
+                # Let the server tell us if the cached response is still valid
+                if cached['etag']:
+                    headers['If-None-Match'] = cached['etag']
+                if cached['last_modified']:
+                    headers['If-Modified-Since'] = cached['last_modified']
+
         logger.debug(
             ('Calling {!r} with headers={!r}, '
              'params={!r} and cookies={!r}').format(
@@ -197,6 +235,9 @@ class NuxeoClient(object):
                 raise self._handle_error(exc)
             resp = default
         else:
+            if cache_key:
+                resp = self._cache_response(cache_key, cached, resp)
+
             content_size = resp.headers.get('content-length', self.chunk_size)
             if int(content_size) <= self.chunk_size:
                 content = resp.text
@@ -243,6 +284,25 @@ class NuxeoClient(object):
             self.auth = TokenAuth(token)
         return token
 
+    @property
+    def identity(self):
+        # type: () -> Text
+        """
+        A stable identifier of the authenticated user, used in cache keys.
+        It holds no secret: the username when known, a hash otherwise.
+        """
+        auth = self.auth
+        if auth is None:
+            return ''
+        if isinstance(auth, (tuple, list)):
+            return 'user:' + get_text(auth[0])
+        username = getattr(auth, 'username', None)
+        if username:
+            # requests.auth.HTTPBasicAuth and HTTPDigestAuth
+            return 'user:' + get_text(username)
+        secret = auth.token if isinstance(auth, TokenAuth) else text(auth)
+        return 'hash:' + hashlib.sha256(get_bytes(secret)).hexdigest()
+
     def is_reachable(self):
         # type: () -> bool
         """ Check if the Nuxeo Platform is reachable. """
@@ -275,6 +335,59 @@ class NuxeoClient(object):
         """ Return the server version. """
         return self.server_info().get('productVersion', '')
 
+    def _cache_key(self, url, headers, params):
+        # type: (Text, Dict[Text, Text], Optional[Any]) -> Text
+        """
+        Build the HTTP cache key of a GET request.  All request headers
+        are part of it as some of them, like X-NXDocumentProperties,
+        X-NXRepository or the enrichers, change the response content.
+        """
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        return json.dumps([url, params, sorted(headers.items()),
+                           self.identity], default=text)
+
+    def _cache_response(
+        self,
+        key,  # type: Text
+        cached,  # type: Optional[Dict[Text, Any]]
+        resp,  # type: requests.Response
+    ):
+        # type: (...) -> requests.Response
+        """
+        Store a GET response in the HTTP cache if it has validators, or
+        rebuild the cached response if the server answered 304.
+        """
+        if resp.status_code == 304 and cached:
+            response = requests.Response()
+            response.status_code = 200
+            response.headers = CaseInsensitiveDict(cached['headers'])
+            response.url = resp.url
+            response.request = resp.request
+            response.encoding = resp.encoding or 'utf-8'
+            response._content = cached['content']
+            resp.close()
+            return response
+
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        cacheable = (
+            resp.status_code == 200
+            and (etag or last_modified)
+            and 'application/json' in resp.headers.get('Content-Type', '')
+            and 'no-store' not in resp.headers.get('Cache-Control', ''))
+        if cacheable:
+            try:
+                self.http_cache.set(key, {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'headers': dict(resp.headers),
+                    'content': resp.content,
+                })
+            except Exception:
+                logger.warning('Cannot store in the HTTP cache', exc_info=True)
+        return resp
+
     @staticmethod
     def _handle_error(error):
         # type: (Exception) -> Exception
@@ -325,6 +438,7 @@ class Nuxeo(object):
         self.client = client(auth, host=host, app_name=app_name,
                              version=version, **kwargs)
         self.operations = operations.API(self.client)
+        self.bulk = bulk.API(self.client)
         self.directories = directories.API(self.client)
         self.groups = groups.API(self.client)
         self.tasks = tasks.API(self.client)
@@ -0,0 +1,191 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import json
+import os
+from array import array
+
+from .compat import text
+from .constants import SPILL_ROWS
+from .exceptions import BadQuery
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from typing import TYPE_CHECKING
+    if TYPE_CHECKING:
+        from typing import Any, Dict, Iterable, List, Optional, Text, Union
+        Column = Union[array, List[Any], 'numpy.ndarray']
+except ImportError:
+    pass
+
+# Name of the file describing the columns of a spilled result set
+MANIFEST = 'columns.json'
+
+
+class Columns(object):
+    """
+    Column-oriented storage for query results.
+
+    Each column is accumulated in its own buffer.  Columns with a type
+    code (see the :mod:`array` module, e.g. 'l' or 'd') are stored in
+    typed arrays, other columns in lists of interned strings.  Missing
+    values are stored as NaN in float columns and as 0 in integer ones.
+
+    When a `directory` is given, the buffers are written to it every
+    `spill_rows` rows so that large exports do not have to fit in
+    memory.  The directory contains one file per column: raw machine
+    values for typed columns, one JSON value per line for the others.
+    It can be opened again with :meth:`Columns.load`.
+
+    :param names: the names of the columns
+    :param types: the type code of the typed columns
+    :param directory: where to spill the buffers, if any
+    :param spill_rows: the number of buffered rows before spilling
+    """
+
+    def __init__(
+        self,
+        names,  # type: List[Text]
+        types=None,  # type: Optional[Dict[Text, Text]]
+        directory=None,  # type: Optional[Text]
+        spill_rows=SPILL_ROWS,  # type: int
+    ):
+        # type: (...) -> None
+        self.names = list(names)
+        self.types = dict(types or {})
+        unknown = set(self.types) - set(self.names)
+        if unknown:
+            raise BadQuery('Unknown typed columns: {}'.format(
+                ', '.join(sorted(unknown))))
+
+        self.directory = directory
+        self.spill_rows = spill_rows
+        self.rows = 0
+        self._spilled = 0
+        self._strings = {}  # type: Dict[Text, Text]
+        self._buffers = [self._new_buffer(name) for name in self.names]
+
+        if directory:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            for idx in range(len(self.names)):
+                open(self._file(idx), 'wb').close()
+            self._write_manifest()
+
+    def __len__(self):
+        # type: () -> int
+        return self.rows
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} rows={} names={!r}>'.format(
+            type(self).__name__, self.rows, self.names)
+
+    def __getitem__(self, name):
+        # type: (Text) -> Column
+        return self.column(name)
+
+    def append(self, row):
+        # type: (Iterable[Any]) -> None
+        """ Append a row, its values being in the order of the columns. """
+        for buffer, value in zip(self._buffers, row):
+            if isinstance(buffer, array):
+                buffer.append(self._number(buffer.typecode, value))
+            else:
+                if isinstance(value, text):
+                    value = self._strings.setdefault(value, value)
+                buffer.append(value)
+
+        self.rows += 1
+        if self.directory and self.rows - self._spilled >= self.spill_rows:
+            self.spill()
+
+    def column(self, name):
+        # type: (Text) -> Column
+        """
+        Get all the values of a column.
+
+        Typed columns are returned as NumPy arrays when NumPy is
+        installed, else as :class:`array.array` objects.
+        """
+        idx = self.names.index(name)
+        values = self._new_buffer(name)
+        if self.directory and self._spilled:
+            self._read(idx, values)
+        values.extend(self._buffers[idx])
+
+        if numpy is None:
+            return values
+        if isinstance(values, array):
+            return numpy.frombuffer(values, dtype=values.typecode)
+        return numpy.array(values, dtype=object)
+
+    def spill(self):
+        # type: () -> None
+        """ Write the buffered rows to the directory. """
+        if not self.directory or self.rows == self._spilled:
+            return
+
+        for idx, buffer in enumerate(self._buffers):
+            with open(self._file(idx), 'ab') as f:
+                if isinstance(buffer, array):
+                    buffer.tofile(f)
+                else:
+                    for value in buffer:
+                        f.write(json.dumps(value).encode('utf-8') + b'\n')
+            self._buffers[idx] = self._new_buffer(self.names[idx])
+
+        self._spilled = self.rows
+        self._write_manifest()
+
+    @classmethod
+    def load(cls, directory):
+        # type: (Text) -> Columns
+        """ Open the columns previously spilled into a directory. """
+        with open(os.path.join(directory, MANIFEST), 'rb') as f:
+            manifest = json.loads(f.read().decode('utf-8'))
+
+        columns = cls(manifest['names'], types=manifest['types'])
+        columns.directory = directory
+        columns.rows = columns._spilled = manifest['rows']
+        return columns
+
+    def _file(self, idx):
+        # type: (int) -> Text
+        kind = 'bin' if self.names[idx] in self.types else 'jsonl'
+        return os.path.join(self.directory, '{}.{}'.format(idx, kind))
+
+    def _new_buffer(self, name):
+        # type: (Text) -> Union[array, List[Any]]
+        typecode = self.types.get(name)
+        return array(str(typecode)) if typecode else []
+
+    @staticmethod
+    def _number(typecode, value):
+        # type: (Text, Any) -> Union[int, float]
+        if typecode in 'fd':
+            return float('nan') if value is None else float(value)
+        return 0 if value is None else int(value)
+
+    def _read(self, idx, values):
+        # type: (int, Union[array, List[Any]]) -> None
+        with open(self._file(idx), 'rb') as f:
+            if isinstance(values, array):
+                values.fromfile(f, self._spilled)
+            else:
+                for line in f:
+                    value = json.loads(line.decode('utf-8'))
+                    if isinstance(value, text):
+                        value = self._strings.setdefault(value, value)
+                    values.append(value)
+
+    def _write_manifest(self):
+        # type: () -> None
+        manifest = {'names': self.names, 'types': self.types,
+                    'rows': self._spilled}
+        with open(os.path.join(self.directory, MANIFEST), 'wb') as f:
+            f.write(json.dumps(manifest).encode('utf-8'))
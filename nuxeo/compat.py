@@ -1,6 +1,8 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+import os
+
 try:
     from typing import TYPE_CHECKING
     if TYPE_CHECKING:
@@ -20,6 +22,31 @@ try:
 except NameError:
     long = int
 
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+try:
+    from os import replace
+except ImportError:
+    def replace(src, dst):
+        # type: (Text, Text) -> None
+        """ Rename a file, replacing the destination if it exists. """
+        try:
+            os.rename(src, dst)
+        except OSError:
+            # Windows does not rename over an existing file
+            if not os.path.isfile(dst):
+                raise
+            os.remove(dst)
+            os.rename(src, dst)
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
 try:
     text = unicode  # type: Type[Text]
 except NameError:
@@ -50,3 +77,18 @@ def get_text(data):
     if not isinstance(data, text):
         data = data.decode('utf-8')
     return data
+
+
+def with_metaclass(meta, *bases):
+    # type: (Type, Type) -> Type
+    """
+    Create a base class with a metaclass, for both Python 2 and 3:
+
+        >>> class Model(with_metaclass(ModelMeta, object)):
+        ...     pass
+    """
+    class metaclass(type):
+        def __new__(cls, name, this_bases, namespace):
+            return meta(name, bases, namespace)
+
+    return type.__new__(metaclass, str('temporary_class'), (), {})
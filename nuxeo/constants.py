@@ -1,6 +1,20 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+# Initial and maximum delays between two status checks of an
+# asynchronous operation, in seconds
+ASYNC_POLL_DELAY = 0.5
+ASYNC_POLL_MAX_DELAY = 10
+
+# Number of files sharing the same batch in a batch pool
+BATCH_POOL_SIZE = 100
+
+# Maximum number of entries in caches
+CACHE_SIZE = 1000
+
+# Lifetime of a cache entry, in seconds
+CACHE_TTL = 60
+
 # Force parameters verification for all operations
 CHECK_PARAMS = False
 
@@ -24,5 +38,27 @@ DEFAULT_APP_NAME = 'Python client'
 # Retries for each upload/chunk upload before abandoning
 MAX_RETRY = 3
 
+# Maximum number of items waiting between two stages of an import
+IMPORT_QUEUE_SIZE = 100
+
+# Lifetime of a "document not found" answer of an existence check,
+# in seconds
+MISSING_TTL = 5
+
+# Maximum number of uids in a NXQL "ecm:uuid IN (...)" clause
+NXQL_IN_CHUNK = 200
+
+# Default number of documents per call of operations.API.execute_batches()
+OPERATION_BATCH_SIZE = 500
+
+# Number of rows per page when iterating over a result set query
+QUERY_PAGE_SIZE = 1000
+
+# Number of rows kept in memory before spilling query columns to disk
+SPILL_ROWS = 100000
+
 # Size of chunks for the upload
 UPLOAD_CHUNK_SIZE = 256 * 1024  # 256 Kio
+
+# Number of threads used for concurrent requests
+WORKERS = 4
@@ -1,22 +1,37 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+import re
+from collections import OrderedDict, namedtuple
+from threading import BoundedSemaphore
+
+from .cache import LRUCache
+from .changes import ChangeFeed
+from .columns import Columns
+from .constants import (MISSING_TTL, NXQL_IN_CHUNK, QUERY_PAGE_SIZE,
+                        SPILL_ROWS, WORKERS)
 from .endpoint import APIEndpoint
 from .exceptions import BadQuery, HTTPError, UnavailableConvertor
 from .models import Document
-from .utils import SwapAttr
+from .utils import SwapAttr, chunks, nxql_quote, parallel_map
 from .workflows import API as WorkflowsAPI
 
 try:
     from typing import TYPE_CHECKING
     if TYPE_CHECKING:
-        from typing import Any, Dict, List, Optional, Text, Union
+        from typing import (Any, Dict, Iterable, Iterator, List, Optional,
+                            Set, Text, Tuple, Union)
+        from .cache import DocumentCache, PathCache
         from .client import NuxeoClient
         from .models import Blob, Workflow
         from .operations import API as OperationsAPI
 except ImportError:
     pass
 
+FROM_CLAUSE = re.compile(r'(?:^|\s)(FROM\s.+)$', re.IGNORECASE | re.DOTALL)
+SELECT_CLAUSE = re.compile(
+    r'^\s*SELECT\s+(?:DISTINCT\s+)?(.+?)\s+FROM\s', re.IGNORECASE | re.DOTALL)
+
 
 class API(APIEndpoint):
     """ Endpoint for documents. """
@@ -27,23 +42,152 @@ class API(APIEndpoint):
         workflows,  # type: WorkflowsAPI
         endpoint=None,  # type: Text
         headers=None,  # type: Optional[Dict[Text, Text]]
+        cache=None,  # type: Optional[DocumentCache]
+        permissions_cache=None,  # type: Optional[LRUCache]
+        path_cache=None,  # type: Optional[PathCache]
+        missing_cache=None,  # type: Optional[LRUCache]
     ):
         # type: (...) -> None
+        """
+        :param cache: if set, documents are looked up in this cache
+                      before being fetched from the server
+        :param permissions_cache: if set, the permissions of documents
+                                  are kept there for :func:`has_permission`
+        :param path_cache: if set, documents got by path with
+                           :func:`get` are fetched by uid when their
+                           uid is known
+        :param missing_cache: where documents not found by :func:`exists`
+                              and :func:`exists_many` are kept for a
+                              short time, defaults to a
+                              :class:`nuxeo.cache.LRUCache`
+        """
         self.operations = operations
         self.workflows_api = workflows
+        self.cache = cache
+        self.permissions_cache = permissions_cache
+        self.path_cache = path_cache
+        if missing_cache is None:
+            missing_cache = LRUCache(ttl=MISSING_TTL)
+        self.missing_cache = missing_cache
+        self._in_flight = None  # type: Optional[BoundedSemaphore]
+        self._max_in_flight = None  # type: Optional[int]
         super(API, self).__init__(
             client, endpoint=endpoint, cls=Document, headers=headers)
 
-    def get(self, uid=None, path=None):
-        # type: (Optional[Text], Optional[Text]) -> Document
+    @property
+    def missing_cache(self):
+        # type: () -> Optional[LRUCache]
+        """
+        The documents not found, shared with the operations endpoint
+        which empties it after operations that may create documents.
+        """
+        return self.operations.missing_cache
+
+    @missing_cache.setter
+    def missing_cache(self, value):
+        # type: (Optional[LRUCache]) -> None
+        self.operations.missing_cache = value
+
+    @property
+    def max_in_flight(self):
+        # type: () -> Optional[int]
+        """
+        If set, the maximum number of creation requests sent at the same
+        time by all the calls to :func:`create_many`, whatever their
+        number of workers.  Change it while no creation is running: the
+        running ones keep the previous limit.
+        """
+        return self._max_in_flight
+
+    @max_in_flight.setter
+    def max_in_flight(self, value):
+        # type: (Optional[int]) -> None
+        self._in_flight = BoundedSemaphore(value) if value else None
+        self._max_in_flight = value
+
+    def get(self, uid=None, path=None, cached=True, **kwargs):
+        # type: (Optional[Text], Optional[Text], bool, Any) -> Document
         """
         Get the detail of a document.
 
+        Only the needed parts of the document can be requested, e.g.
+        `schemas=['dublincore']`.  Such partial documents are not added
+        to the documents cache.
+
         :param uid: the uid of the document
         :param path: the path of the document
+        :param cached: if False, the document is fetched from the server
+                       even when it is in the documents cache, which is
+                       then updated
+        :param kwargs: the `schemas`, `fetch`, `depth` or `enrichers`
+                       to use, see :func:`NuxeoClient.request`
         :return: the document
         """
-        return super(API, self).get(path=self._path(uid=uid, path=path))
+        if self.cache is not None and cached and not kwargs:
+            doc = self.cache.get(uid=uid, path=path, scope=self._scope)
+            if doc is not None:
+                return doc
+
+        doc = None
+        if not uid and self.path_cache is not None:
+            doc = self._get_known_path(path, **kwargs)
+        if doc is None:
+            doc = super(API, self).get(
+                path=self._path(uid=uid, path=path), **kwargs)
+        self._cache([doc], partial=bool(kwargs))
+        return doc
+
+    def get_many(
+        self,
+        uids,  # type: Iterable[Text]
+        chunk=NXQL_IN_CHUNK,  # type: int
+        workers=WORKERS,  # type: int
+        **kwargs  # type: Any
+    ):
+        # type: (...) -> Tuple[List[Document], List[Text]]
+        """
+        Get the details of several documents at once.
+
+        Uids are grouped into NXQL queries using the `ecm:uuid IN (...)`
+        clause, each query fetching up to `chunk` documents.  Queries are
+        run concurrently.
+
+        :param uids: the uids of the documents
+        :param chunk: the maximum number of uids per query
+        :param workers: the number of concurrent queries
+        :param kwargs: the `schemas`, `fetch`, `depth` or `enrichers`
+                       to use, see :func:`get`
+        :return: the documents found, in the order of `uids`,
+                 and the uids of the documents not found
+        """
+        uids = list(uids)
+        unique = list(OrderedDict.fromkeys(uids))
+
+        found = {}  # type: Dict[Text, Document]
+        if self.cache is not None and not kwargs:
+            for uid in unique:
+                doc = self.cache.get(uid=uid, scope=self._scope)
+                if doc is not None:
+                    found[uid] = doc
+            unique = [uid for uid in unique if uid not in found]
+
+        def fetch(batch):
+            # type: (List[Text]) -> List[Document]
+            query = 'SELECT * FROM Document WHERE ecm:uuid IN ({})'.format(
+                ', '.join(nxql_quote(uid) for uid in batch))
+            res = self.operations.execute(
+                command='Document.Query',
+                params={'query': query, 'pageSize': len(batch)}, **kwargs)
+            return [Document.parse(entry, service=self)
+                    for entry in res['entries']]
+
+        for docs in parallel_map(fetch, chunks(unique, chunk), workers):
+            found.update((doc.uid, doc) for doc in docs)
+            self._cache(docs, partial=bool(kwargs))
+
+        documents = [found[uid] for uid in uids if uid in found]
+        missing = [uid for uid in unique if uid not in found]
+        return documents, missing
 
     def post(self, document, parent_id=None, parent_path=None):
         # type: (Document, Optional[Text], Optional[Text]) -> Document
@@ -55,21 +199,94 @@ class API(APIEndpoint):
         :param parent_path: the path of the parent document
         :return: the created document
         """
-        return super(API, self).post(
+        doc = super(API, self).post(
             document, path=self._path(uid=parent_id, path=parent_path))
+        self._cache([doc])
+        self.missing_cache.clear()
+        return doc
 
     create = post  # Alias for clarity
 
-    def put(self, document):
-        # type: (Document) -> Document
+    def create_many(
+        self,
+        documents,  # type: Iterable[Document]
+        parent_id=None,  # type: Optional[Text]
+        parent_path=None,  # type: Optional[Text]
+        workers=WORKERS,  # type: int
+    ):
+        # type: (...) -> List[Union[Document, Exception]]
+        """
+        Create several documents in the same parent, concurrently.
+
+        A failure does not stop the other creations: the exception is
+        returned in place of the document.  The number of requests
+        sent at the same time by all the calls can be limited with
+        :attr:`max_in_flight`.
+
+            >>> results = nuxeo.documents.create_many(docs, parent_path=ws)
+            >>> errors = [res for res in results
+            ...           if isinstance(res, Exception)]
+
+        :param documents: the documents to create
+        :param parent_id: the id of the parent document
+        :param parent_path: the path of the parent document
+        :param workers: the number of concurrent requests
+        :return: the created documents or the exceptions raised,
+                 in the order of `documents`
+        """
+        semaphore = self._in_flight
+
+        def create(document):
+            # type: (Document) -> Union[Document, Exception]
+            try:
+                if semaphore is None:
+                    return self.post(document, parent_id=parent_id,
+                                     parent_path=parent_path)
+                with semaphore:
+                    return self.post(document, parent_id=parent_id,
+                                     parent_path=parent_path)
+            except Exception as exc:
+                return exc
+
+        return parallel_map(create, documents, workers)
+
+    def put(self, document, check_change_token=False, partial=False):
+        # type: (Document, bool, bool) -> Document
         """
         Update a document.
 
         :param document: the document to update
+        :param check_change_token: if True, the update is refused
+                                   (HTTP 409) when the document has been
+                                   modified on the server in the meantime
+        :param partial: if True, only the properties modified since the
+                        document was fetched are sent, see
+                        :class:`nuxeo.models.TrackedDict`: values
+                        changed in place, like a list appended to, must
+                        be assigned again
         :return: the updated document
         """
-        return super(API, self).put(
-            document, path=self._path(uid=document.uid))
+        if partial:
+            data = {
+                'entity-type': 'document',
+                'uid': document.uid,
+                'properties': document.properties.changes(),
+            }
+        else:
+            data = document.as_dict()
+        if check_change_token:
+            data['changeToken'] = document.changeToken
+
+        try:
+            doc = super(API, self).put(
+                document, path=self._path(uid=document.uid), data=data)
+        finally:
+            # After the request, as a concurrent get() may have cached
+            # the document again in the meantime
+            self._invalidate(document.uid)
+        document.properties.dirty.clear()
+        self._cache([doc])
+        return doc
 
     def delete(self, document_id):
         # type: (Text) -> None
@@ -78,24 +295,82 @@ class API(APIEndpoint):
 
         :param document_id: the id of the document to delete
         """
-        super(API, self).delete(self._path(uid=document_id))
+        try:
+            super(API, self).delete(self._path(uid=document_id))
+        finally:
+            self._invalidate(document_id)
+            self._forget_path(document_id)
 
     def exists(self, uid=None, path=None):
         # type: (Optional[Text], Optional[Text]) -> bool
         """
         Check if a document exists.
 
+        Documents already in the cache are not requested, and
+        the missing ones are remembered for `constants.MISSING_TTL`
+        seconds.  Others are checked with a HEAD request.
+
         :param uid: the id of the document to check
         :param path: the path of the document to check
         :return: True if it exists, else False
         """
-        try:
-            self.get(uid=uid, path=path)
-            return True
-        except HTTPError as e:
-            if e.status != 404:
-                raise e
-        return False
+        key = self._missing_key(uid or path)
+        if key in self.missing_cache:
+            return False
+        if self.cache is not None:
+            doc = self.cache.get(uid=uid, path=path, scope=self._scope)
+            if doc is not None:
+                return True
+
+        found = super(API, self).exists(self._path(uid=uid, path=path))
+        if not found:
+            self.missing_cache.set(key, True)
+        return found
+
+    def exists_many(self, uids, chunk=NXQL_IN_CHUNK, workers=WORKERS):
+        # type: (Iterable[Text], int, int) -> Dict[Text, bool]
+        """
+        Check if several documents exist at once.
+
+        Uids are grouped into NXQL queries selecting only the
+        `ecm:uuid` column, each query checking up to `chunk` uids.
+        Queries are run concurrently.  As with :func:`exists`, cached
+        documents are not requested and missing ones are remembered.
+
+        :param uids: the uids of the documents to check
+        :param chunk: the maximum number of uids per query
+        :param workers: the number of concurrent queries
+        :return: a mapping of each uid, in the order of `uids`,
+                 to True if it exists, else False
+        """
+        result = OrderedDict.fromkeys(uids)  # type: Dict[Text, Any]
+        unknown = []
+        for uid in result:
+            if self._missing_key(uid) in self.missing_cache:
+                result[uid] = False
+            elif (self.cache is not None
+                    and self.cache.get(uid=uid, scope=self._scope)
+                    is not None):
+                result[uid] = True
+            else:
+                unknown.append(uid)
+
+        def fetch(batch):
+            # type: (List[Text]) -> List[Text]
+            query = 'SELECT ecm:uuid FROM Document WHERE ecm:uuid IN ({})'
+            query = query.format(', '.join(nxql_quote(uid) for uid in batch))
+            rows = self.query_rows(query, page_size=len(batch))
+            return [row.ecm_uuid for row in rows]
+
+        found = set()  # type: Set[Text]
+        for existing in parallel_map(fetch, chunks(unknown, chunk), workers):
+            found.update(existing)
+
+        for uid in unknown:
+            result[uid] = uid in found
+            if uid not in found:
+                self.missing_cache.set(self._missing_key(uid), True)
+        return result
 
     def add_permission(self, uid, params):
         # type: (Text, Dict[Text, Any]) -> None
@@ -107,6 +382,21 @@ class API(APIEndpoint):
         """
         self.operations.execute(
             command='Document.AddPermission', input_obj=uid, params=params)
+        self._forget_permissions()
+
+    def change_feed(self, root=None, store=None, page_size=QUERY_PAGE_SIZE):
+        # type: (Optional[Text], Any, int) -> ChangeFeed
+        """
+        Get a feed of the changes made on documents, see
+        :class:`nuxeo.changes.ChangeFeed`.
+
+        :param root: if set, only changes below this path are returned
+        :param store: where to save the feed cursor between runs
+        :param page_size: the number of log entries fetched per request
+        :return: the change feed
+        """
+        return ChangeFeed(
+            self.operations, root=root, store=store, page_size=page_size)
 
     def convert(self, uid, options):
         # type: (Text, Dict[Text, Text]) -> Union[Text, Dict[Text, Any]]
@@ -145,9 +435,7 @@ class API(APIEndpoint):
         :param uid: the uid of the document
         :return: the ACLs
         """
-        req = super(API, self).get(
-            path=self._path(uid=uid), cls=dict, headers=self.headers,
-            enrichers=['acls'])
+        req = self.fetch_context(uid, enrichers=['acls'])
         return req['contextParameters']['acls']
 
     def fetch_audit(self, uid):
@@ -161,6 +449,31 @@ class API(APIEndpoint):
         return super(API, self).get(
             self._path(uid=uid), adapter='audit', cls=dict)
 
+    def fetch_context(self, uid, enrichers=None, fetch=None):
+        # type: (Text, Optional[List[Text]], Optional[List[Text]]) -> Dict
+        """
+        Fetch a document with several enrichers and fetched properties
+        at once, instead of one call for each of them:
+
+            >>> nuxeo.documents.fetch_context(
+            ...     uid, enrichers=['acls', 'permissions'], fetch=['lock'])
+
+        :param uid: the uid of the document
+        :param enrichers: the enrichers, their results being
+                          in the 'contextParameters' of the document
+        :param fetch: the parts of the document to fetch, e.g. 'lock'
+        :return: the document JSON
+        """
+        req = super(API, self).get(
+            path=self._path(uid=uid), cls=dict, enrichers=enrichers,
+            fetch=fetch)
+
+        context = req.get('contextParameters', {})
+        if self.permissions_cache is not None and 'permissions' in context:
+            self.permissions_cache.set(
+                self._permissions_key(uid), context['permissions'])
+        return req
+
     def fetch_lock_status(self, uid):
         # type: (Text) -> Dict[Text, Any]
         """
@@ -169,10 +482,7 @@ class API(APIEndpoint):
         :param uid: the uid of the document
         :return: the lock status
         """
-        headers = self.headers or {}
-        headers.update({'fetch-document': 'lock'})
-        req = super(API, self).get(
-            path=self._path(uid=uid), cls=dict, headers=headers)
+        req = self.fetch_context(uid, fetch=['lock'])
         if 'lockOwner' in req:
             return {
                 'lockCreated': req['lockOwner'],
@@ -202,11 +512,7 @@ class API(APIEndpoint):
         :param uid: the uid of a document
         :return: the renditions
         """
-        headers = self.headers or {}
-        headers.update({'enrichers-document': 'renditions'})
-
-        req = super(API, self).get(
-            path=self._path(uid=uid), cls=dict, headers=headers)
+        req = self.fetch_context(uid, enrichers=['renditions'])
         return [rend['name']
                 for rend in req['contextParameters']['renditions']]
 
@@ -219,9 +525,8 @@ class API(APIEndpoint):
         :param name: the name of the transition
         """
         params = {'value': name}
-        return self.operations.execute(
-            command='Document.FollowLifecycleTransition',
-            input_obj=uid, params=params)
+        return self._execute(
+            uid, 'Document.FollowLifecycleTransition', params=params)
 
     def fetch_blob(self, uid=None, path=None, xpath='blobholder:0'):
         # type: (Optional[Text], Optional[Text], Text) -> Blob
@@ -237,37 +542,45 @@ class API(APIEndpoint):
         return super(API, self).get(
             path=self._path(uid=uid, path=path), raw=True, adapter=adapter)
 
-    def get_children(self, uid=None, path=None):
-        # type: (Optional[Text], Optional[Text]) -> List[Document]
+    def get_children(self, uid=None, path=None, **kwargs):
+        # type: (Optional[Text], Optional[Text], Any) -> List[Document]
         """
         Get the children of a document.
 
         :param uid: the uid of the document
         :param path: the path of the document
+        :param kwargs: the `schemas`, `fetch`, `depth` or `enrichers`
+                       to use, see :func:`get`
         :return: the document children
         """
-        return super(API, self).get(
-            path=self._path(uid=uid, path=path), adapter='children')
+        docs = super(API, self).get(
+            path=self._path(uid=uid, path=path), adapter='children',
+            **kwargs)
+        return self._refresh(docs, partial=bool(kwargs))
 
     def has_permission(self, uid, permission):
         # type: (Text, Text) -> bool
         """
-        Check if a document has a permission.
+        Check if a document has a permission.  The answer comes from
+        the permissions cache, when set and still valid.
 
         :param uid: the uid of the document
         :param permission: the permission to check
         :return: True if the document has it, False otherwise
         """
-        req = super(API, self).get(
-            path=self._path(uid=uid), cls=dict, headers=self.headers,
-            enrichers=['permissions'])
-        return permission in req['contextParameters']['permissions']
+        permissions = None
+        if self.permissions_cache is not None:
+            permissions = self.permissions_cache.get(
+                self._permissions_key(uid))
+        if permissions is None:
+            req = self.fetch_context(uid, enrichers=['permissions'])
+            permissions = req['contextParameters']['permissions']
+        return permission in permissions
 
     def lock(self, uid):
         # type: (Text) -> Dict[Text, Any]
         """ Lock a document. """
-        return self.operations.execute(
-            command='Document.Lock', input_obj=uid)
+        return self._execute(uid, 'Document.Lock')
 
     def move(self, uid, dst, name=None):
         # type: (Text, Text, Optional[Text]) -> Dict[Text, Any]
@@ -281,15 +594,21 @@ class API(APIEndpoint):
         params = {'target': dst}
         if name:
             params['name'] = name
-        return self.operations.execute(
-            command='Document.Move', input_obj=uid, params=params)
+        try:
+            return self._execute(
+                uid, 'Document.Move', params=params, moved=True)
+        finally:
+            self._forget_permissions()
+            self.missing_cache.clear()
 
-    def query(self, opts=None):
-        # type: (Optional[Dict[Text, Text]]) -> Dict[Text, Any]
+    def query(self, opts=None, **kwargs):
+        # type: (Optional[Dict[Text, Text]], Any) -> Dict[Text, Any]
         """
         Run a query on the documents.
 
         :param opts: a query or a pageProvider
+        :param kwargs: the `schemas`, `fetch`, `depth` or `enrichers`
+                       to use, see :func:`get`
         :return: the corresponding documents
         """
         opts = opts or {}
@@ -301,11 +620,91 @@ class API(APIEndpoint):
             raise BadQuery('Need either a pageProvider or a query')
 
         path = 'query/{}'.format(query)
-        res = super(API, self).get(path=path, params=opts, cls=dict)
-        res['entries'] = [Document.parse(entry, service=self)
-                          for entry in res['entries']]
+        res = super(API, self).get(path=path, params=opts, cls=dict, **kwargs)
+        res['entries'] = self._refresh(
+            [Document.parse(entry, service=self) for entry in res['entries']],
+            partial=bool(kwargs))
         return res
 
+    def query_columns(
+        self,
+        query,  # type: Text
+        columns,  # type: List[Text]
+        types=None,  # type: Optional[Dict[Text, Text]]
+        directory=None,  # type: Optional[Text]
+        page_size=QUERY_PAGE_SIZE,  # type: int
+        spill_rows=SPILL_ROWS,  # type: int
+    ):
+        # type: (...) -> Columns
+        """
+        Run a NXQL query and store the results column by column.
+
+        The SELECT clause of the query, if any, is replaced by the
+        given columns.  Values are accumulated in typed buffers while
+        pages are fetched, ready to be used by vectorized code:
+
+            >>> cols = nuxeo.documents.query_columns(
+            ...     'SELECT * FROM File', ['ecm:uuid', 'file:content/length'],
+            ...     types={'file:content/length': 'q'})
+            >>> total_size = cols['file:content/length'].sum()
+
+        :param query: the NXQL query
+        :param columns: the columns to select
+        :param types: the array type code of the numeric columns
+        :param directory: if set, where to spill the buffers
+        :param page_size: the number of rows fetched per request
+        :param spill_rows: the number of buffered rows before spilling
+        :return: the results
+        """
+        match = FROM_CLAUSE.search(query)
+        if not match:
+            raise BadQuery('The query must have a FROM clause.')
+        query = 'SELECT {} {}'.format(', '.join(columns), match.group(1))
+
+        results = Columns(columns, types=types, directory=directory,
+                          spill_rows=spill_rows)
+        for row in self.query_rows(query, page_size=page_size):
+            results.append(row)
+        results.spill()
+        return results
+
+    def query_rows(self, query, page_size=QUERY_PAGE_SIZE):
+        # type: (Text, int) -> Iterator[Tuple[Any, ...]]
+        """
+        Run a NXQL query selecting only some columns.
+
+        Instead of full documents, the server sends only the selected
+        values, which are yielded as named tuples.  Pages are fetched
+        one after the other as the rows are consumed:
+
+            >>> query = 'SELECT ecm:uuid, dc:title FROM Document'
+            >>> for row in nuxeo.documents.query_rows(query):
+            ...     print(row.ecm_uuid, row.dc_title)
+
+        Field names are the column names where every character that
+        is not allowed in a Python identifier is replaced by '_'.
+
+        :param query: the NXQL query, with an explicit SELECT clause
+        :param page_size: the number of rows fetched per request
+        :return: an iterator over the rows
+        """
+        columns = self._select_columns(query)
+        fields = [re.sub(r'\W', '_', column) for column in columns]
+        row_type = namedtuple('Row', fields, rename=True)
+
+        page = 0
+        while True:
+            res = self.operations.execute(
+                command='Repository.ResultSetQuery',
+                params={'query': query, 'pageSize': page_size,
+                        'currentPageIndex': page})
+            for entry in res['entries']:
+                yield row_type._make([entry.get(col) for col in columns])
+
+            if not res.get('isNextPageAvailable'):
+                break
+            page += 1
+
     def remove_permission(self, uid, params):
         # type: (Text, Dict[Text, Text]) -> None
         """
@@ -316,6 +715,7 @@ class API(APIEndpoint):
         """
         self.operations.execute(
             command='Document.RemovePermission', input_obj=uid, params=params)
+        self._forget_permissions()
 
     def trash(self, uid):
         # type: (Text) -> Dict[Text, Any]
@@ -324,14 +724,12 @@ class API(APIEndpoint):
 
         :param uid: the uid of the document
         """
-        return self.operations.execute(
-            command='Document.Trash', input_obj=uid)
+        return self._execute(uid, 'Document.Trash', moved=True)
 
     def unlock(self, uid):
         # type: (Text) -> Dict[Text, Any]
         """ Unlock a document. """
-        return self.operations.execute(
-            command='Document.Unlock', input_obj=uid)
+        return self._execute(uid, 'Document.Unlock')
 
     def untrash(self, uid):
         # type: (Text) -> Dict[Text, Any]
@@ -340,8 +738,10 @@ class API(APIEndpoint):
 
         :param uid: the uid of the document
         """
-        return self.operations.execute(
-            command='Document.Untrash', input_obj=uid)
+        try:
+            return self._execute(uid, 'Document.Untrash', moved=True)
+        finally:
+            self.missing_cache.clear()
 
     def workflows(self, document):
         # type: (Document) -> Union[Workflow, List[Workflow]]
@@ -351,6 +751,129 @@ class API(APIEndpoint):
         with SwapAttr(self.workflows_api, 'endpoint', self.endpoint):
             return super(WorkflowsAPI, self.workflows_api).get(path=path)
 
+    def _cache(self, docs, partial=False):
+        # type: (List[Document], bool) -> None
+        """
+        Add documents fetched from the server to the cache.  Partial
+        documents, lacking some schemas, only update the paths.
+        """
+        if self.cache is not None and not partial:
+            for doc in docs:
+                self.cache.add(doc, scope=self._scope)
+        self._remember_paths(docs)
+
+    def _execute(self, uid, command, params=None, moved=False):
+        # type: (Text, Text, Optional[Dict[Text, Any]], bool) -> Any
+        """
+        Run an operation changing a document.  The cached document is
+        forgotten once the operation is done, so that a concurrent
+        get() cannot cache it again with its previous state, and the
+        document returned is cached instead.
+
+        :param moved: if True, the paths of the document and of its
+                      children are forgotten too
+        """
+        try:
+            res = self.operations.execute(
+                command=command, input_obj=uid, params=params or {})
+        finally:
+            self._invalidate(uid)
+            if moved:
+                self._forget_path(uid)
+        if isinstance(res, dict) and res.get('entity-type') == 'document':
+            self._cache([Document.parse(res, service=self)])
+        return res
+
+    def _get_known_path(self, path, **kwargs):
+        # type: (Text, Any) -> Optional[Document]
+        """
+        Get a document by the uid cached for its path.  The document
+        may have been moved or removed by someone else in the meantime,
+        the path is then forgotten.
+        """
+        scope = self.client.repository
+        uid = self.path_cache.get(path, scope=scope)
+        if not uid:
+            return None
+        try:
+            doc = super(API, self).get(path=self._path(uid=uid), **kwargs)
+        except HTTPError as e:
+            if e.status != 404:
+                raise
+            doc = None
+        if doc is None or (doc.path or '').rstrip('/') != path.rstrip('/'):
+            self.path_cache.discard(uid, scope=scope)
+            return None
+        return doc
+
+    def _forget_permissions(self):
+        # type: () -> None
+        """
+        Empty the permissions cache: a permission change on a folder
+        also changes the permissions of everything below it.
+        """
+        if self.permissions_cache is not None:
+            self.permissions_cache.clear()
+
+    def _invalidate(self, uid):
+        # type: (Text) -> None
+        """ Remove a document, and its children, from the cache. """
+        if self.cache is not None:
+            self.cache.discard(uid)
+
+    def _refresh(self, docs, partial=False):
+        # type: (List[Document], bool) -> List[Document]
+        """ Replace stale cached documents with the ones just fetched. """
+        if self.cache is not None and not partial:
+            for doc in docs:
+                self.cache.refresh(doc, scope=self._scope)
+        self._remember_paths(docs)
+        return docs
+
+    def _remember_paths(self, docs):
+        # type: (List[Document]) -> None
+        """ Add the paths of documents fetched from the server. """
+        if self.path_cache is not None:
+            for doc in docs:
+                self.path_cache.add(
+                    doc.path, doc.uid, scope=self.client.repository)
+
+    def _forget_path(self, uid):
+        # type: (Text) -> None
+        """ Forget the path of a document, and of its children. """
+        if self.path_cache is not None:
+            self.path_cache.discard(uid, scope=self.client.repository)
+
+    @property
+    def _scope(self):
+        # type: () -> Tuple[Text, Text]
+        """ Cached documents depend on the repository and the schemas. """
+        schemas = self.client.schemas
+        if isinstance(schemas, list):
+            schemas = ','.join(schemas)
+        return self.client.repository, schemas
+
+    def _missing_key(self, ref):
+        # type: (Text) -> Tuple[Text, Text, Text]
+        """ Documents may be hidden to some users, hence the credentials. """
+        return self.client.identity, self.client.repository, ref
+
+    def _permissions_key(self, uid):
+        # type: (Text) -> Tuple[Text, Text, Text]
+        """ Permissions depend on the user, hence the credentials. """
+        return self.client.identity, self.client.repository, uid
+
+    @staticmethod
+    def _select_columns(query):
+        # type: (Text) -> List[Text]
+        """ Extract the column names from the SELECT clause of a query. """
+        match = SELECT_CLAUSE.match(query)
+        columns = match.group(1).split(',') if match else []
+        columns = [column.strip() for column in columns]
+        if not columns or '*' in columns:
+            raise BadQuery('The query must select explicit columns.')
+        return columns
+
     def _path(self, uid=None, path=None):
         # type: (Optional[Text], Optional[Text]) -> Text
         if uid:
@@ -1,8 +1,11 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+import json
+
 from requests import Response
 
+from .compat import text
 from .exceptions import BadQuery, HTTPError
 
 try:
@@ -19,8 +22,14 @@ class APIEndpoint(object):
     """
     Represents an API endpoint for Nuxeo, containing common patterns
     for CRUD operations.
+
+    When `coalesce` is True, identical GET requests running at the same
+    time are sent only once, their parsed result being shared.
     """
 
+    # Share the result of identical concurrent GET requests
+    coalesce = False
+
     def __init__(
         self,
         client,  # type: NuxeoClient
@@ -66,6 +75,17 @@ class APIEndpoint(object):
         :return: one or more instances of cls parsed from
                  the returned JSON
         """
+        if self.coalesce:
+            key = json.dumps(
+                [self.endpoint, path, getattr(cls, '__name__', None), raw,
+                 single, kwargs, self.client.schemas, self.client.repository,
+                 self.client.identity], sort_keys=True, default=text)
+            return self.client.single_flight.do(
+                key, self._get, path, cls, raw, single, **kwargs)
+        return self._get(path, cls, raw, single, **kwargs)
+
+    def _get(self, path, cls, raw, single, **kwargs):
+        # type: (Optional[Text], Optional[Type], bool, bool, Any) -> Any
         endpoint = self.endpoint
 
         if not cls:
@@ -123,19 +143,27 @@ class APIEndpoint(object):
             return response
         return self._cls.parse(response.json(), service=self)
 
-    def put(self, resource=None, path=None, **kwargs):
-        # type: (Optional[Model], Optional[Text], Any) -> Any
+    def put(
+        self,
+        resource=None,  # type: Optional[Model]
+        path=None,  # type: Optional[Text]
+        data=None,  # type: Optional[Dict[Text, Any]]
+        **kwargs  # type: Any
+    ):
+        # type: (...) -> Any
         """
         Edits an existing resource.
 
         :param resource: the resource instance
         :param path: the endpoint (URL path) for the request
+        :param data: the data to send, instead of the whole resource
         :return: the modified resource
         """
 
         endpoint = '{}/{}'.format(self.endpoint, path or resource.uid)
 
-        data = resource.as_dict() if resource else resource
+        if data is None:
+            data = resource.as_dict() if resource else resource
 
         response = self.client.request('PUT', endpoint, data=data, **kwargs)
 
@@ -156,7 +184,8 @@ class APIEndpoint(object):
     def exists(self, path):
         # type: (Text) -> bool
         """
-        Checks if a resource exists.
+        Checks if a resource exists.  A HEAD request is used so that
+        the resource is neither downloaded nor parsed.
 
         :param path: the endpoint (URL path) for the request
         :return: True if it exists, else False
@@ -164,7 +193,13 @@ class APIEndpoint(object):
         endpoint = '{}/{}'.format(self.endpoint, path)
 
         try:
-            self.client.request('GET', endpoint)
+            try:
+                self.client.request('HEAD', endpoint).close()
+            except HTTPError as e:
+                # Some resources do not handle HEAD requests
+                if e.status != 405:
+                    raise
+                self.client.request('GET', endpoint).close()
             return True
         except HTTPError as e:
             if e.status != 404:
@@ -6,7 +6,7 @@ from .compat import text
 try:
     from typing import TYPE_CHECKING
     if TYPE_CHECKING:
-        from typing import Any, Dict, Optional, Text
+        from typing import Any, Dict, List, Optional, Text, Tuple
 except ImportError:
     pass
 
@@ -84,6 +84,32 @@ class InvalidBatch(NuxeoError):
     """ Exception thrown when accessing inexistant or deleted batches. """
 
 
+class OperationBatchError(NuxeoError):
+    """
+    Exception thrown when an operation executed batch by batch
+    failed on some batches.
+
+    :param command: the operation
+    :param result: the aggregated result of the successful batches
+    :param failures: the failed batches and their errors
+    """
+    def __init__(self, command, result, failures):
+        # type: (Text, Any, List[Tuple[List[Text], Exception]]) -> None
+        self.command = command
+        self.result = result
+        self.failures = failures
+
+    def __repr__(self):
+        # type: () -> Text
+        return ('OperationBatchError: {} failed on {} batch(es), '
+                'first error: {!r}').format(
+            self.command, len(self.failures), self.failures[0][1])
+
+    def __str__(self):
+        # type: () -> Text
+        return repr(self)
+
+
 class Unauthorized(HTTPError):
     """ Exception thrown when the HTTPError code is 401 or 403. """
 
@@ -0,0 +1,342 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import logging
+import os
+from threading import Event, Lock, Thread
+
+from .compat import Queue, monotonic
+from .constants import IMPORT_QUEUE_SIZE, WORKERS
+from .exceptions import HTTPError
+from .models import Document, FileBlob
+
+try:
+    from typing import TYPE_CHECKING
+    if TYPE_CHECKING:
+        from typing import (Any, Callable, Dict, List, Optional, Text,
+                            Tuple)
+        from .client import Nuxeo
+        from .models import Blob
+        from .uploads import BatchPool
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+
+class ImportStats(object):
+    """ Progress of an import, updated while it runs. """
+
+    def __init__(self):
+        # type: () -> None
+        self.folders = 0
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.errors = []  # type: List[Tuple[Text, Exception]]
+        self.started = monotonic()
+        self.finished = None  # type: Optional[float]
+        self._lock = Lock()
+
+    def __repr__(self):
+        # type: () -> Text
+        return ('<{} folders={} files={} bytes={} skipped={} failed={} '
+                'files/s={:.1f}>').format(
+            type(self).__name__, self.folders, self.files, self.bytes,
+            self.skipped, len(self.errors), self.files_per_second)
+
+    @property
+    def elapsed(self):
+        # type: () -> float
+        """ The duration of the import so far, in seconds. """
+        return (self.finished or monotonic()) - self.started
+
+    @property
+    def files_per_second(self):
+        # type: () -> float
+        """ The number of files imported per second. """
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        # type: () -> float
+        """ The number of bytes uploaded per second. """
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def add(self, **counts):
+        # type: (int) -> None
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def fail(self, path, exc):
+        # type: (Text, Exception) -> None
+        logger.warning('Cannot import {!r}: {}'.format(path, exc))
+        with self._lock:
+            self.errors.append((path, exc))
+
+
+class Importer(object):
+    """
+    Import a local directory tree into a folder of the server.
+
+    Four stages run at the same time, each one with its own threads,
+    connected by queues holding at most `queue_size` items:
+
+    - the tree is scanned, parents first;
+    - documents are created, folders before their children;
+    - the content of files is uploaded, files sharing batches through
+      a :class:`nuxeo.uploads.BatchPool`;
+    - the uploaded blobs are attached to their documents.
+
+        >>> importer = Importer(nuxeo, '/data/photos',
+        ...                     '/default-domain/workspaces/photos',
+        ...                     store=DiskCache('/tmp/import-state'))
+        >>> stats = importer.run()
+
+    When a `store` is given, such as :class:`nuxeo.cache.DiskCache`,
+    the progress of every file and folder is saved there.  Running the
+    import again with the same store skips what has already been done,
+    so an interrupted import resumes where it stopped.
+
+    :param server: the Nuxeo instance to import into
+    :param source: the local directory to import
+    :param target: the path of the folder to import into
+    :param store: where to save the progress, anything with get() and
+                  set() methods
+    :param folder_type: the type of the documents created for folders
+    :param file_type: the type of the documents created for files
+    :param workers: the number of threads of each stage, as a dict
+                    with 'create', 'upload' and 'attach' keys,
+                    defaulting to WORKERS
+    :param queue_size: the maximum number of items between stages
+    :param callback: if set, called with the stats after each file
+    """
+
+    def __init__(
+        self,
+        server,  # type: Nuxeo
+        source,  # type: Text
+        target,  # type: Text
+        store=None,  # type: Any
+        folder_type='Folder',  # type: Text
+        file_type='File',  # type: Text
+        workers=None,  # type: Optional[Dict[Text, int]]
+        queue_size=IMPORT_QUEUE_SIZE,  # type: int
+        callback=None,  # type: Optional[Callable[[ImportStats], Any]]
+    ):
+        # type: (...) -> None
+        self.server = server
+        self.source = os.path.abspath(source)
+        self.target = target
+        self.store = store
+        self.folder_type = folder_type
+        self.file_type = file_type
+        self.workers = {'create': WORKERS, 'upload': WORKERS,
+                        'attach': WORKERS}
+        self.workers.update(workers or {})
+        self.queue_size = queue_size
+        self.callback = callback
+        self.stats = ImportStats()
+        self._folders = {}  # type: Dict[Text, _Folder]
+        self._pool = None  # type: Optional[BatchPool]
+        self._resuming = False
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} source={!r} target={!r} stats={!r}>'.format(
+            type(self).__name__, self.source, self.target, self.stats)
+
+    def run(self):
+        # type: () -> ImportStats
+        """
+        Import the tree and wait for the end of the import.
+
+        Errors do not stop the import: they are kept in the `errors`
+        attribute of the returned stats.  The documents below a folder
+        that could not be created are not imported.
+
+        :return: the stats of the import
+        """
+        self.stats = ImportStats()
+        root = self.server.documents.get(path=self.target)
+        self._folders = {'': _Folder(root)}
+        self._pool = self.server.uploads.pool()
+        self._resuming = bool(self.store is not None
+                              and self.store.get(self._key('')))
+        if self.store is not None:
+            self.store.set(self._key(''), {'uid': root.uid,
+                                           'path': root.path, 'done': True})
+
+        size = self.queue_size
+        to_create, to_upload, to_attach = Queue(size), Queue(size), Queue(size)
+        stages = [
+            ([Thread(target=self._scan, args=(to_create,))], None),
+            (self._threads('create', self._create, to_create, to_upload),
+             to_create),
+            (self._threads('upload', self._upload, to_upload, to_attach),
+             to_upload),
+            (self._threads('attach', self._attach, to_attach, None),
+             to_attach),
+        ]
+        for threads, _ in stages:
+            for thread in threads:
+                # Do not prevent the interruption of the import
+                thread.daemon = True
+                thread.start()
+
+        # Once a stage is over, tell the threads of the next one to stop
+        for (threads, _), (next_threads, queue) in zip(stages, stages[1:]):
+            for thread in threads:
+                thread.join()
+            for _ in next_threads:
+                queue.put(None)
+        for thread in stages[-1][0]:
+            thread.join()
+        self._pool.close()
+
+        self.stats.finished = monotonic()
+        return self.stats
+
+    def _threads(self, stage, func, queue_in, queue_out):
+        # type: (Text, Callable, Queue, Optional[Queue]) -> List[Thread]
+        def work():
+            # type: () -> None
+            while True:
+                item = queue_in.get()
+                if item is None:
+                    break
+                try:
+                    result = func(*item)
+                except Exception as exc:
+                    self.stats.fail(item[0], exc)
+                    self._notify()
+                    continue
+                if result is not None and queue_out is not None:
+                    queue_out.put(result)
+
+        count = max(1, self.workers.get(stage, WORKERS))
+        return [Thread(target=work, name='import-{}-{}'.format(stage, idx))
+                for idx in range(count)]
+
+    def _scan(self, queue):
+        # type: (Queue) -> None
+        """ Walk the tree, queueing folders before their content. """
+        for dirpath, dirnames, filenames in os.walk(self.source):
+            dirnames.sort()
+            rel_dir = os.path.relpath(dirpath, self.source)
+            rel_dir = '' if rel_dir == '.' else rel_dir
+            for name in dirnames:
+                rel = os.path.join(rel_dir, name)
+                self._folders[rel] = _Folder()
+                queue.put((rel, True))
+            for name in sorted(filenames):
+                queue.put((os.path.join(rel_dir, name), False))
+
+    def _create(self, rel, is_folder):
+        # type: (Text, bool) -> Optional[Tuple[Text, Document]]
+        """ Create the document of a folder or a file. """
+        folder = self._folders.get(rel) if is_folder else None
+        try:
+            state = self._state(rel)
+            if state and state['done']:
+                doc = Document(uid=state['uid'], path=state['path'])
+                self.stats.add(skipped=1)
+            else:
+                doc = self._document(rel, is_folder, state)
+        except Exception:
+            if folder:
+                folder.ready.set()
+            raise
+
+        if is_folder:
+            folder.doc = doc
+            folder.ready.set()
+            if not (state and state['done']):
+                self._save(rel, doc, done=True)
+                self.stats.add(folders=1)
+            return None
+        if state and state['done']:
+            self._notify()
+            return None
+        self._save(rel, doc, done=False)
+        return rel, doc
+
+    def _document(self, rel, is_folder, state):
+        # type: (Text, bool, Optional[Dict[Text, Any]]) -> Document
+        """ Create a document, or find the one of a previous run. """
+        if state:
+            return Document(uid=state['uid'], path=state['path'])
+
+        parent = self._folders[os.path.dirname(rel)]
+        parent.ready.wait()
+        if parent.doc is None:
+            raise ValueError('The parent folder has not been imported.')
+
+        name = os.path.basename(rel)
+        if self._resuming:
+            # Created right before the previous run was interrupted?
+            try:
+                return self.server.documents.get(
+                    path='{}/{}'.format(parent.doc.path.rstrip('/'), name))
+            except HTTPError as exc:
+                if exc.status != 404:
+                    raise
+
+        doc = Document(name=name,
+                       type=self.folder_type if is_folder else self.file_type,
+                       properties={'dc:title': name})
+        return self.server.documents.create(doc, parent_id=parent.doc.uid)
+
+    def _upload(self, rel, doc):
+        # type: (Text, Document) -> Tuple[Text, Document, Blob, int]
+        """ Upload the content of a file. """
+        blob = FileBlob(os.path.join(self.source, rel))
+        return rel, doc, self._pool.upload(blob), blob.size
+
+    def _attach(self, rel, doc, blob, size):
+        # type: (Text, Document, Blob, int) -> None
+        """ Attach an uploaded file to its document. """
+        try:
+            self._pool.attach(blob, doc.uid)
+        except Exception:
+            self._pool.release(blob)
+            raise
+        self._save(rel, doc, done=True)
+        self.stats.add(files=1, bytes=size)
+        self._notify()
+
+    def _key(self, rel):
+        # type: (Text) -> Text
+        return 'import:{}:{}'.format(
+            self.target.rstrip('/'), rel.replace(os.sep, '/'))
+
+    def _notify(self):
+        # type: () -> None
+        if self.callback:
+            self.callback(self.stats)
+
+    def _save(self, rel, doc, done):
+        # type: (Text, Document, bool) -> None
+        if self.store is not None:
+            self.store.set(self._key(rel), {
+                'uid': doc.uid, 'path': doc.path, 'done': done})
+
+    def _state(self, rel):
+        # type: (Text) -> Optional[Dict[Text, Any]]
+        if self.store is None:
+            return None
+        return self.store.get(self._key(rel))
+
+
+class _Folder(object):
+    """ A folder being imported, its children waiting for its document. """
+
+    __slots__ = ('doc', 'ready')
+
+    def __init__(self, doc=None):
+        # type: (Optional[Document]) -> None
+        self.doc = doc
+        self.ready = Event()
+        if doc is not None:
+            self.ready.set()
@@ -0,0 +1,430 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import json
+import sqlite3
+from threading import RLock
+
+from .compat import get_bytes, get_text, long, text
+from .constants import NXQL_IN_CHUNK, QUERY_PAGE_SIZE
+from .utils import chunks, nxql_quote
+
+try:
+    from typing import TYPE_CHECKING
+    if TYPE_CHECKING:
+        from typing import (Any, Dict, Iterable, Iterator, List, Optional,
+                            Set, Text, Tuple)
+        from .changes import ChangeFeed
+        from .documents import API as DocumentsAPI
+except ImportError:
+    pass
+
+# Columns always mirrored, and the NXQL property filling each of them
+COLUMNS = [
+    ('uid', 'ecm:uuid'),
+    ('path', 'ecm:path'),
+    ('type', 'ecm:primaryType'),
+    ('state', 'ecm:currentLifeCycleState'),
+    ('digest', 'file:content/digest'),
+]
+
+# The documents mirrored: neither versions, proxies nor trashed ones, the
+# change feed reporting trashed documents as deleted
+LIVE = 'ecm:isVersion = 0 AND ecm:isProxy = 0 AND ecm:isTrashed = 0'
+
+# Paths below a prefix ending with '/' sort between the prefix and the
+# prefix where the '/' is replaced with the next character, '0'.  Such
+# range conditions can use the index on paths.
+BELOW = 'path > ? AND path < ?'
+
+
+class Mirror(object):
+    """
+    Local SQLite copy of some metadata of documents, answering simple
+    queries without any server round trip.
+
+    The `uid`, `path`, `type`, `state` and `digest` (of the main blob)
+    columns are always mirrored, plus one column per property listed
+    in `properties`.  :func:`load` fetches all documents below `root`,
+    except versions, proxies and trashed documents, then :func:`sync`
+    applies the changes made since, using a
+    :class:`nuxeo.changes.ChangeFeed` whose cursor is saved in the same
+    database, along with the rows:
+
+        >>> mirror = Mirror(nuxeo.documents, 'mirror.db',
+        ...                 root='/default-domain/workspaces',
+        ...                 properties=['dc:title'])
+        >>> mirror.load()
+        >>> # Later on, or in another run
+        >>> mirror.sync()
+        >>> notes = mirror.find(path='/default-domain/workspaces/ws',
+        ...                     type='Note', where={'dc:title': 'foo'})
+
+    :param documents: the documents endpoint
+    :param database: the SQLite database file
+    :param root: the path of the mirrored tree
+    :param properties: the other properties to mirror
+    :param page_size: the number of rows fetched per request
+    """
+
+    def __init__(
+        self,
+        documents,  # type: DocumentsAPI
+        database=':memory:',  # type: Text
+        root='/',  # type: Text
+        properties=None,  # type: Optional[List[Text]]
+        page_size=QUERY_PAGE_SIZE,  # type: int
+    ):
+        # type: (...) -> None
+        self.documents = documents
+        self.database = database
+        self.root = root.rstrip('/') or '/'
+        self.properties = list(properties or [])
+        self.page_size = page_size
+        self.columns = COLUMNS + [(prop, prop) for prop in self.properties]
+        self._lock = RLock()
+        self._db = sqlite3.connect(database, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._meta = _Meta(self._db)
+        self._create_tables()
+
+    def __len__(self):
+        # type: () -> int
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} database={!r} root={!r} size={}>'.format(
+            type(self).__name__, self.database, self.root, len(self))
+
+    @property
+    def feed(self):
+        # type: () -> ChangeFeed
+        """ The change feed of the mirrored tree. """
+        return self.documents.change_feed(
+            root=self._nxql_root, store=self._meta, page_size=self.page_size)
+
+    def close(self):
+        # type: () -> None
+        """ Close the database. """
+        with self._lock:
+            self._db.close()
+
+    def load(self):
+        # type: () -> int
+        """
+        Replace the mirrored documents with the ones on the server.
+
+        :return: the number of documents loaded
+        """
+        with self._lock:
+            try:
+                # Changes made during the load will be applied by sync()
+                self.feed.reset()
+                self._db.execute('DELETE FROM documents')
+                count = self._upsert(
+                    self._rows(self._select_tree(self._nxql_root)))
+                self._commit()
+            except Exception:
+                self._rollback()
+                raise
+        return count
+
+    def sync(self):
+        # type: () -> int
+        """
+        Apply the changes made on the server since the last load or
+        sync.  Changes are applied by batches of `page_size`, each
+        batch being committed with the change feed cursor.  When a
+        batch fails, it is rolled back along with the cursor, so that
+        the next sync applies its changes again.
+
+        :return: the number of changes applied
+        """
+        count = 0
+        with self._lock:
+            pending = set()  # type: Set[Text]
+            changes = self.feed.poll()
+            try:
+                for change in changes:
+                    count += 1
+                    if (change.kind == 'deleted'
+                            or not self._in_tree(change.path)):
+                        pending.discard(change.uid)
+                        self._delete(change.uid)
+                    else:
+                        if (change.kind == 'moved'
+                                and not self._move(change.uid, change.path)):
+                            # Moved into the tree, along with its children
+                            self._upsert(
+                                self._rows(self._select_tree(change.path)))
+                        pending.add(change.uid)
+
+                    if len(pending) >= self.page_size:
+                        self._refresh(pending)
+                        pending.clear()
+                self._refresh(pending)
+            except Exception:
+                # Let the feed save its cursor now, to roll it back too
+                changes.close()
+                self._rollback()
+                raise
+        return count
+
+    def get(self, uid):
+        # type: (Text) -> Optional[Dict[Text, Any]]
+        """ Get the mirrored metadata of a document. """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT * FROM documents WHERE uid = ?', (uid,)).fetchone()
+        return self._decode(row) if row else None
+
+    def children(self, path):
+        # type: (Text) -> List[Dict[Text, Any]]
+        """ Get the mirrored metadata of the children of a document. """
+        prefix = path.rstrip('/') + '/'
+        return self._select_rows(
+            BELOW + ' AND instr(substr(path, ?), ?) = 0',
+            self._bounds(prefix) + (len(prefix) + 1, '/'))
+
+    def find(
+        self,
+        path=None,  # type: Optional[Text]
+        type=None,  # type: Optional[Text]
+        state=None,  # type: Optional[Text]
+        where=None,  # type: Optional[Dict[Text, Any]]
+    ):
+        # type: (...) -> List[Dict[Text, Any]]
+        """
+        Find mirrored documents matching all the given criteria.
+
+        :param path: only documents below this path
+        :param type: only documents of this type
+        :param state: only documents in this lifecycle state
+        :param where: the values of other mirrored columns
+        :return: the metadata of the documents, sorted by path
+        """
+        clauses = []  # type: List[Text]
+        params = ()  # type: Tuple[Any, ...]
+        if path:
+            clauses.append(BELOW)
+            params += self._bounds(path.rstrip('/') + '/')
+
+        criteria = dict(where or {})
+        if type:
+            criteria['type'] = type
+        if state:
+            criteria['state'] = state
+        for name, value in sorted(criteria.items()):
+            clauses.append('{} = ?'.format(self._column(name)))
+            params += (self._encode(value),)
+
+        return self._select_rows(' AND '.join(clauses) or '1', params)
+
+    @staticmethod
+    def _bounds(prefix):
+        # type: (Text) -> Tuple[Text, Text]
+        """ The parameters of the BELOW clause. """
+        return prefix, prefix[:-1] + '0'
+
+    def _column(self, name):
+        # type: (Text) -> Text
+        if name not in dict(self.columns):
+            raise ValueError('{!r} is not a mirrored column'.format(name))
+        return '"{}"'.format(name)
+
+    def _commit(self):
+        # type: () -> None
+        """ Commit the changes of the documents, and the cursor. """
+        self._meta.flush()
+        self._db.commit()
+
+    def _create_tables(self):
+        # type: () -> None
+        with self._lock:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS documents '
+                '(uid TEXT PRIMARY KEY, path TEXT, type TEXT, state TEXT, '
+                'digest TEXT)')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS documents_path '
+                'ON documents (path)')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS meta '
+                '(key TEXT PRIMARY KEY, value TEXT)')
+            existing = {row[1] for row in self._db.execute(
+                'PRAGMA table_info(documents)')}
+            for prop in self.properties:
+                if prop not in existing:
+                    self._db.execute('ALTER TABLE documents ADD COLUMN '
+                                     '{}'.format(self._column(prop)))
+            self._db.commit()
+
+    def _delete(self, uid):
+        # type: (Text) -> None
+        """ Delete a document and everything below it. """
+        row = self._db.execute(
+            'SELECT path FROM documents WHERE uid = ?', (uid,)).fetchone()
+        self._db.execute('DELETE FROM documents WHERE uid = ?', (uid,))
+        if row and row[0]:
+            self._db.execute('DELETE FROM documents WHERE ' + BELOW,
+                             self._bounds(row[0].rstrip('/') + '/'))
+
+    def _move(self, uid, path):
+        # type: (Text, Optional[Text]) -> bool
+        """
+        Update the paths of everything below a moved document.
+
+        :return: False if the document was not mirrored
+        """
+        row = self._db.execute(
+            'SELECT path FROM documents WHERE uid = ?', (uid,)).fetchone()
+        if not row:
+            return False
+        if not row[0] or not path or row[0] == path:
+            return True
+        old = row[0].rstrip('/') + '/'
+        self._db.execute(
+            'UPDATE documents SET path = ? || substr(path, ?) WHERE ' + BELOW,
+            (path.rstrip('/') + '/', len(old) + 1) + self._bounds(old))
+        return True
+
+    def _refresh(self, uids):
+        # type: (Set[Text]) -> None
+        """ Fetch the current metadata of documents, and commit. """
+        for batch in chunks(sorted(uids), NXQL_IN_CHUNK):
+            query = '{} WHERE {} AND ecm:uuid IN ({})'.format(
+                self._select(), LIVE,
+                ', '.join(nxql_quote(uid) for uid in batch))
+            rows = [row for row in self._rows(query)
+                    if self._in_tree(row[1])]
+            self._upsert(rows)
+            for uid in set(batch) - {row[0] for row in rows}:
+                # Gone, trashed, or moved out of the mirrored tree
+                self._delete(uid)
+        self._commit()
+
+    def _rollback(self):
+        # type: () -> None
+        """ Cancel the changes of the documents, and of the cursor. """
+        self._meta.discard()
+        self._db.rollback()
+
+    def _rows(self, query):
+        # type: (Text) -> Iterator[Tuple[Any, ...]]
+        return (tuple(row) for row in self.documents.query_rows(
+            query, page_size=self.page_size))
+
+    def _select(self):
+        # type: () -> Text
+        return 'SELECT {} FROM Document'.format(
+            ', '.join(prop for _, prop in self.columns))
+
+    def _select_tree(self, path):
+        # type: (Optional[Text]) -> Text
+        """ The query of the documents at and below a path, if any. """
+        query = '{} WHERE {}'.format(self._select(), LIVE)
+        if path and path != '/':
+            path = nxql_quote(path)
+            query += ' AND (ecm:path STARTSWITH {} OR ecm:path = {})'.format(
+                path, path)
+        return query
+
+    def _select_rows(self, clause, params):
+        # type: (Text, Tuple[Any, ...]) -> List[Dict[Text, Any]]
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT * FROM documents WHERE {} ORDER BY path'.format(
+                    clause), params).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def _upsert(self, rows):
+        # type: (Iterable[Tuple[Any, ...]]) -> int
+        """ Insert or replace rows of documents below the root. """
+        sql = 'INSERT OR REPLACE INTO documents ({}) VALUES ({})'.format(
+            ', '.join(self._column(name) for name, _ in self.columns),
+            ', '.join('?' * len(self.columns)))
+        count = 0
+        for batch in chunks(rows, self.page_size):
+            batch = [tuple(self._encode(value) for value in row)
+                     for row in batch if self._in_tree(row[1])]
+            self._db.executemany(sql, batch)
+            count += len(batch)
+        return count
+
+    def _in_tree(self, path):
+        # type: (Optional[Text]) -> bool
+        """ Check if a path is in the mirrored tree. """
+        path = path or ''
+        return (self.root == '/' or path == self.root
+                or path.startswith(self.root + '/'))
+
+    @property
+    def _nxql_root(self):
+        # type: () -> Optional[Text]
+        """ The root path to filter queries with, if any. """
+        return None if self.root == '/' else self.root
+
+    @staticmethod
+    def _decode(row):
+        # type: (sqlite3.Row) -> Dict[Text, Any]
+        doc = {}
+        for key in row.keys():
+            value = row[key]
+            if value is not None and not isinstance(
+                    value, (text, int, long, float)):
+                # A BLOB, see _encode()
+                value = json.loads(get_text(bytes(value)))
+            doc[key] = value
+        return doc
+
+    @staticmethod
+    def _encode(value):
+        # type: (Any) -> Any
+        """
+        Lists and dicts are stored as JSON in BLOBs, so that they cannot
+        be mistaken for strings.
+        """
+        if isinstance(value, (list, dict)):
+            return sqlite3.Binary(get_bytes(json.dumps(value, sort_keys=True)))
+        return value
+
+
+class _Meta(object):
+    """
+    Key-value storage for the change feed cursor.  Values are only
+    written by flush(), right before the documents they describe are
+    committed, see Mirror.sync().
+    """
+
+    def __init__(self, db):
+        # type: (sqlite3.Connection) -> None
+        self._db = db
+        self._pending = {}  # type: Dict[Text, Any]
+
+    def get(self, key, default=None):
+        # type: (Text, Any) -> Any
+        if key in self._pending:
+            return self._pending[key]
+        row = self._db.execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        # type: (Text, Any) -> None
+        self._pending[key] = value
+
+    def flush(self):
+        # type: () -> None
+        """ Write the values set since the last flush. """
+        for key, value in self._pending.items():
+            self._db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                             (key, json.dumps(value)))
+        self._pending.clear()
+
+    def discard(self):
+        # type: () -> None
+        """ Forget the values set since the last flush. """
+        self._pending.clear()
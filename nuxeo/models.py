@@ -4,15 +4,17 @@ from __future__ import unicode_literals
 import os
 from io import StringIO
 
-from .compat import text
+from .compat import text, with_metaclass
 from .exceptions import InvalidBatch
 from .utils import guess_mimetype
 
 try:
     from typing import TYPE_CHECKING
     if TYPE_CHECKING:
-        from typing import Any, BinaryIO, Dict, List, Optional, Text, Union
+        from typing import (Any, BinaryIO, Callable, Dict, List, Optional,
+                            Set, Text, Tuple, Type, Union)
         from io import FileIO
+        from .bulk import API as BulkAPI
         from .directories import API as DirectoriesAPI
         from .documents import API as DocumentsAPI
         from .endpoint import APIEndpoint
@@ -28,10 +30,50 @@ except ImportError:
 """ Base classes """
 
 
-class Model(object):
-    """ Base class for all entities. """
+class ModelMeta(type):
+    """
+    Metaclass of models.  It precomputes the attribute name of each
+    JSON property in `_attr_map`, and the attributes default values in
+    `_defaults`.  For classes declaring `__slots__`, it also adds a slot
+    for each property not already handled by a parent class or defined
+    in the class itself, like a property.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        # type: (Text, Tuple[Type, ...], Dict[Text, Any]) -> Type
+        props = namespace.get('_valid_properties')
+        if props is None:
+            props = next((base._valid_properties for base in bases
+                          if hasattr(base, '_valid_properties')), {})
+        attr_map = {key: str(key.replace('-', '_')) for key in props}
+        namespace['_attr_map'] = attr_map
+        namespace['_defaults'] = tuple(
+            (attr_map[key], default) for key, default in props.items())
+
+        if '__slots__' in namespace:
+            taken = set()  # type: Set[Text]
+            for base in bases:
+                for klass in base.__mro__:
+                    taken.update(getattr(klass, '__slots__', ()))
+            slots = [str(slot) for slot in namespace['__slots__']]
+            slots += sorted(set(attr for attr in attr_map.values()
+                                if attr not in namespace
+                                and attr not in taken
+                                and attr not in slots))
+            namespace['__slots__'] = tuple(slots)
+
+        return super(ModelMeta, mcs).__new__(mcs, name, bases, namespace)
+
+
+class Model(with_metaclass(ModelMeta, object)):
+    """
+    Base class for all entities.
+
+    Subclasses declaring `__slots__` get a slot per property and no
+    instance dict, see :class:`ModelMeta`.
+    """
+    __slots__ = ('service',)
     _valid_properties = {}  # type: Dict[Text, Any]
-    service = None  # type: APIEndpoint
     uid = None  # type: Text
 
     def __init__(self, service=None, **kwargs):
@@ -68,12 +110,13 @@ class Model(object):
         model = cls()
 
         if service:
-            setattr(model, 'service', service)
+            model.service = service
 
+        attr_map = cls._attr_map
         for key, val in json.items():
-            if key in cls._valid_properties:
-                key = key.replace('-', '_')
-                setattr(model, key, val)
+            attr = attr_map.get(key)
+            if attr is not None:
+                setattr(model, attr, val)
         return model
 
     def save(self):
@@ -82,7 +125,76 @@ class Model(object):
         self.service.put(self)
 
 
+class TrackedDict(dict):
+    """
+    Dict keeping track of its modified keys, in `dirty`.  Values mutated
+    in place, like lists appended to, are not tracked: assign them again.
+
+    :param data: the initial content
+    :param dirty: if True, all initial keys are marked as modified
+    """
+    __slots__ = ('_dirty',)
+
+    def __init__(self, data=None, dirty=True):
+        # type: (Optional[Dict[Text, Any]], bool) -> None
+        super(TrackedDict, self).__init__(data or {})
+        # Most dicts are never modified, create the set on demand
+        self._dirty = set(self) if dirty else None  # type: Optional[Set]
+
+    @property
+    def dirty(self):
+        # type: () -> Set[Text]
+        """ The modified keys. """
+        if self._dirty is None:
+            self._dirty = set()
+        return self._dirty
+
+    def __setitem__(self, key, value):
+        # type: (Text, Any) -> None
+        super(TrackedDict, self).__setitem__(key, value)
+        self.dirty.add(key)
+
+    def __delitem__(self, key):
+        # type: (Text) -> None
+        super(TrackedDict, self).__delitem__(key)
+        self.dirty.add(key)
+
+    def clear(self):
+        # type: () -> None
+        self.dirty.update(self)
+        super(TrackedDict, self).clear()
+
+    def pop(self, key, *default):
+        # type: (Text, Any) -> Any
+        if key in self:
+            self.dirty.add(key)
+        return super(TrackedDict, self).pop(key, *default)
+
+    def popitem(self):
+        # type: () -> Tuple[Text, Any]
+        key, value = super(TrackedDict, self).popitem()
+        self.dirty.add(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        # type: (Text, Any) -> Any
+        if key not in self:
+            self.dirty.add(key)
+        return super(TrackedDict, self).setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        # type: (Any, Any) -> None
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def changes(self):
+        # type: () -> Dict[Text, Any]
+        """ The modified items, removed keys having a None value. """
+        return {key: self.get(key) for key in self._dirty or ()}
+
+
 class RefreshableModel(Model):
+    __slots__ = ()
 
     def load(self, model=None):
         # type: (Optional[Union[Model, Dict[Text, Any]]]) -> None
@@ -113,6 +225,52 @@ class RefreshableModel(Model):
 """ Entities """
 
 
+class AsyncOperation(Model):
+    """
+    Handle of an automation operation executed asynchronously,
+    see :func:`nuxeo.operations.API.execute_async`.
+    """
+    _valid_properties = {
+        'command': None,
+        'execution_id': None,
+        'url': None,
+        'done': False,
+    }
+    service = None  # type: OperationsAPI
+
+    def __init__(self, **kwargs):
+        # type: (Any) -> None
+        super(AsyncOperation, self).__init__(**kwargs)
+        for key, default in AsyncOperation._valid_properties.items():
+            setattr(self, key, kwargs.get(key, default))
+        self._result = None  # type: Any
+        self._fetched = False
+
+    def status(self):
+        # type: () -> Text
+        """ Get the status of the operation. """
+        return self.service.async_status(self)
+
+    def wait(self, timeout=None):
+        # type: (Optional[float]) -> bool
+        """
+        Wait for the operation to be done.
+
+        :param timeout: the maximum time to wait, in seconds
+        :return: True if the operation is done, False on timeout
+        """
+        return self.service.wait_all([self], timeout=timeout)
+
+    def result(self):
+        # type: () -> Any
+        """ Wait for the operation to be done and get its result. """
+        if not self._fetched:
+            self.wait()
+            self._result = self.service.async_result(self)
+            self._fetched = True
+        return self._result
+
+
 class Batch(Model):
     """ Upload batch. """
 
@@ -170,6 +328,19 @@ class Batch(Model):
         self.blobs[file_idx] = blob
         return blob
 
+    def resume_plan(self, blobs):
+        # type: (List[Blob]) -> Dict[int, Any]
+        """
+        Get the upload state of every file of the batch.
+
+        :param blobs: the files to upload in the batch, in order
+        :return: the upload states, by file index
+        """
+        if self.batchId is None:
+            raise InvalidBatch(
+                'Cannot fetch blobs for inexistant/deleted batch.')
+        return self.service.resume_plan(self.uid, blobs)
+
     def upload(self, blob, **kwargs):
         # type: (Blob, Any) -> Blob
         """
@@ -222,12 +393,13 @@ class Blob(Model):
         'uploadedChunkIds': [],
         'chunkCount': 0
     }
-    service = None  # type: UploadsAPI
+    __slots__ = ('batch_id',)
 
     def __init__(self, **kwargs):
         # type: (Any) -> None
         super(Blob, self).__init__(**kwargs)
-        for key, default in Blob._valid_properties.items():
+        self.batch_id = None  # type: Optional[Text]
+        for key, default in self._defaults:
             if key == 'uploaded':
                 val = kwargs.get(key, 'true') == 'true'
             elif key == 'size':
@@ -245,11 +417,13 @@ class Blob(Model):
         model = cls()
 
         if service:
-            setattr(model, 'service', service)
+            model.service = service
 
+        attr_map = cls._attr_map
         for key, val in json.items():
-            if key in cls._valid_properties:
-                setattr(model, key, val)
+            attr = attr_map.get(key)
+            if attr is not None:
+                setattr(model, attr, val)
 
         if model.uploaded and model.uploadedSize == 0:
             model.uploadedSize = model.size
@@ -272,7 +446,7 @@ class BufferBlob(Blob):
     with the `with` statement.
     """
 
-    stringio = None  # type: Optional[StringIO]
+    __slots__ = ('buffer', 'stringio')
 
     def __init__(self, data, **kwargs):
         # type: (Text, Any) -> None
@@ -282,6 +456,7 @@ class BufferBlob(Blob):
         """
         super(BufferBlob, self).__init__(**kwargs)
         self.buffer = data
+        self.stringio = None  # type: Optional[StringIO]
         self.mimetype = 'application/octet-stream'
 
     @property
@@ -307,8 +482,7 @@ class FileBlob(Blob):
     with the `with` statement.
     """
 
-    # File descriptor
-    fd = None  # type: Optional[BinaryIO]
+    __slots__ = ('fd', 'path')
 
     def __init__(self, path, **kwargs):
         # type: (Text, Any) -> None
@@ -317,6 +491,7 @@ class FileBlob(Blob):
         :param **kwargs: named attributes
         """
         super(FileBlob, self).__init__(**kwargs)
+        self.fd = None  # type: Optional[BinaryIO]
         self.path = path
         self.name = os.path.basename(self.path)
         self.size = os.path.getsize(self.path)
@@ -344,6 +519,113 @@ class FileBlob(Blob):
             self.fd.close()
 
 
+class BulkStatus(RefreshableModel):
+    """ Status of a bulk command, see :mod:`nuxeo.bulk`. """
+    _valid_properties = {
+        'entity-type': 'bulkStatus',
+        'commandId': None,
+        'state': None,
+        'action': None,
+        'username': None,
+        'processed': 0,
+        'errorCount': 0,
+        'total': 0,
+        'submitted': None,
+        'completed': None,
+        'processingMillis': 0,
+    }
+    service = None  # type: BulkAPI
+
+    # States of a command which is over
+    DONE_STATES = ('ABORTED', 'COMPLETED')
+
+    def __init__(self, **kwargs):
+        # type: (Any) -> None
+        super(BulkStatus, self).__init__(**kwargs)
+        for key, default in BulkStatus._valid_properties.items():
+            key = key.replace('-', '_')
+            setattr(self, key, kwargs.get(key, default))
+
+    @property
+    def uid(self):
+        # type: () -> Text
+        return self.commandId
+
+    @property
+    def is_done(self):
+        # type: () -> bool
+        """ True if the command is completed or aborted. """
+        return self.state in self.DONE_STATES
+
+    @property
+    def progress(self):
+        # type: () -> float
+        """ The ratio of processed documents, between 0 and 1. """
+        if self.is_done:
+            return 1.0
+        return float(self.processed) / self.total if self.total else 0.0
+
+    def abort(self):
+        # type: () -> None
+        """ Abort the command. """
+        self.load(self.service.abort(self.uid))
+
+    def wait(
+        self,
+        timeout=None,  # type: Optional[float]
+        callback=None,  # type: Optional[Callable[[BulkStatus], Any]]
+    ):
+        # type: (...) -> bool
+        """ Wait for the command to be done, see :func:`bulk.API.wait`. """
+        return self.service.wait(self, timeout=timeout, callback=callback)
+
+
+class Chain(Model):
+    """
+    Automation operations executed one after the other, the output of
+    each operation being the input of the next one:
+
+        >>> chain = nuxeo.operations.chain(input_obj='/default-domain')
+        >>> chain.add('Document.Create', type='File', name='foo')
+        >>> chain.add('Document.FollowLifecycleTransition', value='approve')
+        >>> created, approved = chain.execute()
+    """
+    _valid_properties = {
+        'input_obj': None,
+        'steps': [],
+    }
+    service = None  # type: OperationsAPI
+
+    def __init__(self, **kwargs):
+        # type: (Any) -> None
+        super(Chain, self).__init__(**kwargs)
+        self.input_obj = kwargs.get('input_obj')
+        self.steps = list(kwargs.get('steps', []))
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.steps)
+
+    def add(self, command, input_obj=None, **params):
+        # type: (Text, Optional[Any], Any) -> Chain
+        """
+        Append an operation to the chain.
+
+        :param command: the operation to execute
+        :param input_obj: the input of the operation, instead of
+                          the output of the previous one
+        :param params: the parameters of the operation
+        :return: the chain, so that calls can be chained
+        """
+        self.steps.append((command, input_obj, params))
+        return self
+
+    def execute(self, **kwargs):
+        # type: (Any) -> List[Any]
+        """ Execute the chain, returning the result of each operation. """
+        return self.service.execute_chain(self, **kwargs)
+
+
 class Directory(Model):
     """ Directory. """
     _valid_properties = {
@@ -460,14 +742,77 @@ class Document(RefreshableModel):
         'changeToken': None,
         'contextParameters': {},
     }
-    service = None  # type: DocumentsAPI
+    __slots__ = ('_properties', '_raw_properties')
 
     def __init__(self, **kwargs):
         # type: (Any) -> None
         super(Document, self).__init__(**kwargs)
-        for key, default in Document._valid_properties.items():
-            key = key.replace('-', '_')
-            setattr(self, key, kwargs.get(key, default))
+        for attr, default in self._defaults:
+            setattr(self, attr, kwargs.get(attr, default))
+
+    @property
+    def properties(self):
+        # type: () -> TrackedDict
+        """
+        The document properties.  Modified ones are tracked so that
+        only those can be sent when updating the document, see
+        :func:`nuxeo.documents.API.put`.
+
+        Parsed documents keep the properties as decoded from the server
+        response until they are first accessed: listing documents only
+        to read their uid or path does not pay for them.
+        """
+        props = self._properties
+        if props is None:
+            props = TrackedDict(self._raw_properties, dirty=False)
+            self._properties = props
+            self._raw_properties = None
+        return props
+
+    @properties.setter
+    def properties(self, value):
+        # type: (Dict[Text, Any]) -> None
+        self._properties = TrackedDict(value)
+        self._raw_properties = None
+
+    @classmethod
+    def parse(cls, json, service=None):
+        # type: (Dict[Text, Any], Optional[APIEndpoint]) -> Document
+        """ Parse a JSON object into a model instance. """
+        if cls.__init__ is not Document.__init__:
+            doc = super(Document, cls).parse(json, service=service)
+            doc.properties.dirty.clear()
+            return doc
+
+        # Set every attribute once, instead of setting the defaults
+        # in __init__() and then the values from the JSON object
+        doc = cls.__new__(cls)
+        doc.service = service
+        attr_map = cls._attr_map
+        for key, default in cls._valid_properties.items():
+            if key != 'properties':
+                setattr(doc, attr_map[key], json.get(key, default))
+        doc._properties = None
+        doc._raw_properties = json.get('properties')
+        return doc
+
+    def load(self, model=None):
+        # type: (Optional[Union[Model, Dict[Text, Any]]]) -> None
+        """
+        Reload the document from the server, bypassing the documents
+        cache, or copy another document along with its unsaved changes.
+
+        :param model: the document to copy
+        """
+        if not model:
+            model = self.service.get(self.uid, cached=False)
+        dirty = set()  # type: Set[Text]
+        if isinstance(model, Document):
+            dirty.update(model.properties.dirty)
+
+        super(Document, self).load(model=model)
+        self.properties.dirty.clear()
+        self.properties.dirty.update(dirty)
 
     @property
     def workflows(self):
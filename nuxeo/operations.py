@@ -1,23 +1,27 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+import json
+import random
+from time import sleep
+
 try:
     from collections.abc import Sequence
 except ImportError:
     from collections import Sequence
 
 from . import constants
-from .compat import get_text, long, text
+from .compat import get_text, long, monotonic, text
 from .endpoint import APIEndpoint
-from .exceptions import BadQuery, CorruptedFile
-from .models import Blob, Operation
-from .utils import get_digester
+from .exceptions import BadQuery, CorruptedFile, OperationBatchError
+from .models import AsyncOperation, Blob, Chain, Operation
+from .utils import chunks, get_digester, parallel_map
 
 try:
     from typing import TYPE_CHECKING
     if TYPE_CHECKING:
         from requests import Response
-        from typing import Any, Dict, Optional, Text, Tuple, Type
+        from typing import Any, Dict, List, Optional, Text, Tuple, Type
         from .client import NuxeoClient
 except ImportError:
     pass
@@ -45,15 +49,114 @@ PARAM_TYPES = {
     'validationmethod': ((text, bytes,), None),
 }  # type: Dict[Text, Tuple[Type, ...]]
 
+# Version of the persisted catalog format, bump it to invalidate old entries
+CATALOG_FORMAT = 1
+
+# Keyword arguments of API.execute() which are options of the call,
+# not parameters of the operation
+EXECUTE_OPTIONS = ('batch_size', 'workers', 'schemas', 'fetch', 'depth')
+
+# Operations only reading documents, see API.missing_cache
+READ_ONLY_OPERATIONS = frozenset([
+    'Audit.Query',
+    'Document.Fetch',
+    'Document.FetchByProperty',
+    'Document.GetChild',
+    'Document.GetChildren',
+    'Document.GetParent',
+    'Document.PageProvider',
+    'Document.Query',
+    'Repository.GetDocument',
+    'Repository.PageProvider',
+    'Repository.Query',
+    'Repository.ResultSetQuery',
+])
+
+
+class Validator(object):
+    """
+    Parameters checker of an operation, built once from its catalog entry.
+
+    :param operation: the operation description from the catalog
+    """
+
+    __slots__ = ('accepted', 'required')
+
+    def __init__(self, operation):
+        # type: (Dict[Text, Any]) -> None
+        self.accepted = {}  # type: Dict[Text, Tuple[Type, ...]]
+        required = []
+        for param in operation['params']:
+            # Unknown types cannot be checked
+            types_accepted, default = PARAM_TYPES.get(
+                param['type'], ((object,), None))
+            if param['required']:
+                required.append(param['name'])
+            else:
+                # Allow the default value when the parameter is not required
+                types_accepted += (type(default),)
+            self.accepted[param['name']] = tuple(set(types_accepted))
+        self.required = frozenset(required)
+
+    def check(self, command, params):
+        # type: (Text, Dict[Text, Any]) -> None
+        """ Check given parameters of the `command` operation. """
+        accepted = self.accepted
+        for name, value in params.items():
+            types_accepted = accepted.get(name)
+            if types_accepted is None:
+                err = 'unexpected parameter {!r} for operation {}'
+                raise BadQuery(err.format(name, command))
+
+            if not isinstance(value, types_accepted):
+                types = [type_.__name__ for type_ in types_accepted]
+                if len(types) > 1:
+                    types = ', '.join(types[:-1]) + ' or ' + types[-1]
+                else:
+                    types = types[0]
+                err = ('parameter {}={!r} should be of type {}'
+                       ' (current is {})')
+                raise BadQuery(
+                    err.format(name, value, types, type(value).__name__))
+
+        if not self.required.issubset(params):
+            name = sorted(self.required.difference(params))[0]
+            err = 'missing required parameter {!r} for operation {!r}'
+            raise BadQuery(err.format(name, command))
+
 
 class API(APIEndpoint):
-    """ Endpoint for operations. """
+    """
+    Endpoint for operations.
+
+    The operations catalog is downloaded once per server URL and version,
+    and shared by all clients talking to that server.  When `cache` is
+    set, e.g. to a :class:`nuxeo.cache.DiskCache`, the catalog is also
+    stored there so that new processes do not have to download it again.
+
+    The `missing_cache` is the one of the documents endpoint: it is
+    emptied after any operation but the READ_ONLY_OPERATIONS, as such
+    operations may create documents known to be missing.
+    """
+
+    # Operations catalogs, by server URL and version
+    catalogs = {}  # type: Dict[Tuple[Text, Text], Dict[Text, Any]]
 
-    # Operations cache
-    ops = {}  # type: Dict[Text, Any]
+    # Parameters validators, by server URL and version, then by command
+    validators = {}  # type: Dict[Tuple[Text, Text], Dict[Text, Validator]]
 
-    def __init__(self, client, endpoint='site/automation', headers=None):
-        # type: (NuxeoClient, Text, Optional[Dict[Text, Text]]) -> None
+    # Concurrent first uses share the same catalog download
+    coalesce = True
+
+    def __init__(
+        self,
+        client,  # type: NuxeoClient
+        endpoint='site/automation',  # type: Text
+        headers=None,  # type: Optional[Dict[Text, Text]]
+        cache=None,  # type: Optional[Any]
+    ):
+        # type: (...) -> None
+        self.cache = cache
         headers = headers or {}
         headers.update({
             'Content-Type': 'application/json',
@@ -62,6 +165,8 @@ class API(APIEndpoint):
         super(API, self).__init__(
             client, endpoint=endpoint, cls=dict, headers=headers)
         self.endpoint = endpoint
+        self._server_key = None  # type: Optional[Tuple[Text, Text]]
+        self.missing_cache = None  # type: Optional[Any]
 
     def get(self, **kwargs):
         # type: (Any) -> Dict[Text, Any]
@@ -84,14 +189,50 @@ class API(APIEndpoint):
 
         :return: the available operations
         """
-        if not self.ops:
-            response = self.get()
-            for operation in response['operations']:
-                self.ops[operation['id']] = operation
-                for alias in operation.get('aliases', []):
-                    self.ops[alias] = operation
+        key = self._server()
+        ops = self.catalogs.get(key)
+        if ops is None:
+            ops = self.catalogs[key] = self._load_catalog(*key)
+        return ops
 
-        return self.ops
+    # Kept for backward compatibility
+    ops = operations
+
+    def _server(self):
+        # type: () -> Tuple[Text, Text]
+        """
+        The URL and version of the server, the key of its catalog.  The
+        version is asked once per URL: when it cannot be fetched, the
+        client would otherwise ask it again on every lookup.
+        """
+        host = self.client.host
+        key = self._server_key
+        if key is None or key[0] != host:
+            key = self._server_key = (host, self.client.server_version)
+        return key
+
+    def _load_catalog(self, host, version):
+        # type: (Text, Text) -> Dict[Text, Any]
+        """
+        Get the operations of a server from the persistent cache, or
+        download them.  Without a known server version, the catalog
+        could not be invalidated on upgrade, so it is not persisted.
+        """
+        persist = self.cache is not None and version
+        cache_key = json.dumps([CATALOG_FORMAT, host, version])
+
+        catalog = self.cache.get(cache_key) if persist else None
+        if catalog is None:
+            catalog = self.get()['operations']
+            if persist:
+                self.cache.set(cache_key, catalog)
+
+        ops = {}  # type: Dict[Text, Any]
+        for operation in catalog:
+            ops[operation['id']] = operation
+            for alias in operation.get('aliases', []):
+                ops[alias] = operation
+        return ops
 
     def check_params(self, command, params):
         # type: (Text, Dict[Text, Any]) -> None
@@ -99,47 +240,127 @@ class API(APIEndpoint):
         Check given parameters of the `command` operation.  It will also
         check for types whenever possible.
         """
+        key = self._server()
+        validators = self.validators.setdefault(key, {})
+        validator = validators.get(command)
+        if validator is None:
+            operation = self.operations.get(command)
+            if not operation:
+                raise BadQuery(
+                    '{!r} is not a registered operation'.format(command))
+            validator = validators[command] = Validator(operation)
 
-        operation = self.operations.get(command)
-        if not operation:
-            raise BadQuery(
-                '{!r} is not a registered operation'.format(command))
+        validator.check(command, params)
 
-        parameters = {param['name']: param for param in operation['params']}
+    def chain(self, input_obj=None):
+        # type: (Optional[Any]) -> Chain
+        """ Make a new Chain object. """
+        return Chain(input_obj=input_obj, service=self)
 
-        for name, value in params.items():
-            # Check for unexpected parameters.  We use `dict.pop()` to
-            # get and delete the parameter from the dict.
+    def execute_batches(
+        self,
+        command,  # type: Text
+        input_obj,  # type: List[Text]
+        params,  # type: Dict[Text, Any]
+        batch_size=constants.OPERATION_BATCH_SIZE,  # type: int
+        workers=constants.WORKERS,  # type: int
+        **kwargs  # type: Any
+    ):
+        # type: (...) -> Any
+        """
+        Execute an operation on a list of documents, sub-list by sub-list.
+
+        Every batch is executed, even if some of them fail.  Results are
+        aggregated: lists of documents are merged, other results are
+        returned as a list with one result per batch.
+
+        :param command: the operation to execute
+        :param input_obj: the documents uids or paths
+        :param params: the parameters of the operation
+        :param batch_size: the maximum number of documents per call
+        :param workers: the maximum number of concurrent calls
+        :param kwargs: any other parameter passed to :func:`execute`
+        :return: the aggregated result of the batches
+        :raises OperationBatchError: if a batch failed
+        """
+        if kwargs.pop('check_params', constants.CHECK_PARAMS):
+            self.check_params(command, params)
+        headers = kwargs.pop('headers', None) or {}
+
+        def execute(batch):
+            # type: (List[Text]) -> Tuple[Any, Optional[Exception]]
             try:
-                param = parameters.pop(name)
-            except KeyError:
-                err = 'unexpected parameter {!r} for operation {}'
-                raise BadQuery(err.format(name, command))
+                return self.execute(
+                    command=command, input_obj=batch, params=params,
+                    headers=dict(headers), check_params=False,
+                    **kwargs), None
+            except Exception as exc:
+                return None, exc
+
+        batches = list(chunks(input_obj, batch_size))
+        results = parallel_map(execute, batches, workers=workers)
+
+        failures = [(batch, error) for batch, (_, error)
+                    in zip(batches, results) if error is not None]
+        results = [res for res, error in results if error is None]
+        if results and all(isinstance(res, dict) and
+                           res.get('entity-type') == 'documents'
+                           for res in results):
+            result = {
+                'entity-type': 'documents',
+                'entries': [doc for res in results for doc in res['entries']],
+            }  # type: Any
+        else:
+            result = results
 
-            # Check types
-            types_accepted, default = PARAM_TYPES[param['type']]
-            if not param['required']:
-                # Allow the default value when the parameter is not required
-                types_accepted += (type(default),)
-            types_accepted = tuple(set(types_accepted))  # Uniquify
+        if failures:
+            raise OperationBatchError(command, result, failures)
+        return result
 
-            if not isinstance(value, types_accepted):
-                types = [type_.__name__ for type_ in types_accepted]
-                if len(types) > 1:
-                    types = ', '.join(types[:-1]) + ' or ' + types[-1]
-                else:
-                    types = types[0]
-                err = ('parameter {}={!r} should be of type {}'
-                       ' (current is {})')
-                raise BadQuery(
-                    err.format(name, value, types, type(value).__name__))
+    def execute_chain(self, chain, **kwargs):
+        # type: (Chain, Any) -> List[Any]
+        """
+        Execute the operations of a chain one after the other.
+
+        The parameters of all operations are checked against the catalog
+        before the first call, so that an invalid step does not leave
+        the chain half-done.  When an operation returns a document or a
+        list of documents, it is the input of the next one.  Other
+        results, like blobs, cannot be piped: the next operation must be
+        given its own input.
+
+        :param chain: the chain
+        :param kwargs: any other parameter passed to :func:`execute`
+        :return: the result of each operation
+        :raises BadQuery: if an operation without its own input follows
+                          one returning neither documents nor a document
+        """
+        for command, _, params in chain.steps:
+            self.check_params(command, params)
 
-        # Check for required parameters.  As of now, `parameters` may contain
-        # unclaimed parameters and we just need to check for required ones.
-        for (name, parameter) in parameters.items():
-            if parameter['required']:
-                err = 'missing required parameter {!r} for operation {!r}'
-                raise BadQuery(err.format(name, command))
+        results = []  # type: List[Any]
+        input_obj = chain.input_obj
+        for command, step_input, params in chain.steps:
+            if step_input is not None:
+                input_obj = step_input
+            elif input_obj is None and results:
+                err = ('the result of {} cannot be the input of {}, '
+                       'give it its own input')
+                raise BadQuery(err.format(chain.steps[len(results) - 1][0],
+                                          command))
+            result = self.execute(
+                command=command, input_obj=input_obj, params=params,
+                check_params=False, **kwargs)
+            results.append(result)
+
+            input_obj = None
+            if isinstance(result, dict):
+                entity_type = result.get('entity-type')
+                if entity_type == 'document':
+                    input_obj = result['uid']
+                elif entity_type == 'documents':
+                    input_obj = [doc['uid'] for doc in result['entries']]
+        return results
 
     def execute(
         self,
@@ -165,38 +386,36 @@ class API(APIEndpoint):
         where the response will be saved
         :param kwargs: any other parameter
         :return: the result of the execution
+
+        Operation parameters named like one of the EXECUTE_OPTIONS must
+        be given in `params`: as keyword arguments, they are refused.
+
+        When `batch_size` is set and the input is a list of documents
+        bigger than it, the operation is executed on sub-lists by
+        `workers` threads (default: WORKERS), see
+        :func:`execute_batches`.  Only use it with operations processing
+        each document separately: the result becomes the aggregate of
+        the results of each sub-list.
         """
+        self._check_options(operation, kwargs)
         json = kwargs.pop('json', True)
         check_suspended = kwargs.pop('check_suspended', None)
-        enrichers = kwargs.pop('enrichers', None)
+        batch_size = kwargs.pop('batch_size', None)
+        workers = kwargs.pop('workers', constants.WORKERS)
 
         command, input_obj, params = self.get_attributes(operation, **kwargs)
-
-        if kwargs.pop('check_params', constants.CHECK_PARAMS):
-            self.check_params(command, params)
-
-        url = 'site/automation/{}'.format(command)
-        if isinstance(input_obj, Blob):
-            url = '{}/upload/{}/{}/execute/{}'.format(
-                self.client.api_path, input_obj.batch_id,
-                input_obj.fileIdx, command)
-            input_obj = None
-
-        headers = headers or {}
-        headers.update(self.headers)
-        if void_op:
-            headers['X-NXVoidOperation'] = 'true'
-
-        data = self.get_params(params)
-
-        if input_obj:
-            if isinstance(input_obj, list):
-                input_obj = 'docs:' + ','.join(input_obj)
-            data['input'] = input_obj
-
-        resp = self.client.request(
-            'POST', url, data=data, headers=headers, enrichers=enrichers,
-            default=kwargs.get('default', object))
+        if (batch_size and isinstance(input_obj, list)
+                and len(input_obj) > batch_size and not file_out):
+            options = {key: kwargs[key] for key in
+                       ('check_params', 'default', 'enrichers', 'schemas',
+                        'fetch', 'depth')
+                       if key in kwargs}
+            return self.execute_batches(
+                command, input_obj, params, batch_size=batch_size,
+                workers=workers, void_op=void_op, headers=headers,
+                json=json, **options)
+
+        resp = self._post(operation, void_op, headers, kwargs)
 
         # Save to a file, part by part of chunk_size
         if file_out:
@@ -214,6 +433,115 @@ class API(APIEndpoint):
                 pass
         return resp.content
 
+    def execute_async(
+        self,
+        operation=None,  # type: Optional[Operation]
+        void_op=False,  # type: bool
+        headers=None,  # type: Optional[Dict[Text, Text]]
+        **kwargs  # type: Any
+    ):
+        # type: (...) -> AsyncOperation
+        """
+        Execute an operation asynchronously, on the server side.
+
+        The call returns as soon as the server has accepted the operation.
+        The returned handle gives its status and, once done, its result.
+
+        :param operation: the operation
+        :param void_op: if True, the result will be empty
+        :param headers: extra HTTP headers
+        :param kwargs: any other parameter, see :func:`execute`
+        :return: the handle of the operation
+        """
+        self._check_options(operation, kwargs)
+        resp = self._post(operation, void_op, headers, kwargs, adapter='async')
+        # The server answers with the URL of the operation status:
+        # {operation URL}/@async/{execution ID}/status
+        location = resp.headers['Location']
+        execution_id = location.split('/@async/')[1].split('/')[0]
+        url = resp.request.url[len(self.client.host):].split('/@async')[0]
+        return AsyncOperation(command=url.rsplit('/', 1)[-1], url=url,
+                              execution_id=execution_id, service=self)
+
+    def async_status(self, handle):
+        # type: (AsyncOperation) -> Text
+        """
+        Get the status of an asynchronous operation.
+
+        :param handle: the operation handle
+        :return: 'COMPLETED' if it is done, else the status given
+                 by the server
+        """
+        if handle.done:
+            return 'COMPLETED'
+
+        resp = self.client.request(
+            'GET', '{}/@async/{}/status'.format(
+                handle.url, handle.execution_id),
+            allow_redirects=False)
+
+        # The server redirects to the result once it is available
+        if resp.status_code == 303:
+            handle.done = True
+            return 'COMPLETED'
+        return resp.text.strip('"') or 'RUNNING'
+
+    def async_result(self, handle):
+        # type: (AsyncOperation) -> Any
+        """
+        Get the result of a completed asynchronous operation.
+
+        :param handle: the operation handle
+        :return: the result of the execution
+        """
+        resp = self.client.request(
+            'GET', '{}/@async/{}'.format(handle.url, handle.execution_id))
+        try:
+            return resp.json()
+        except ValueError:
+            return resp.content
+
+    def wait_all(self, handles, timeout=None):
+        # type: (List[AsyncOperation], Optional[float]) -> bool
+        """
+        Wait for asynchronous operations to be done.
+
+        All operations are polled from the current thread.  Each one
+        is polled less and less often, with some randomness to spread
+        the requests over time.
+
+        :param handles: the operations handles
+        :param timeout: the maximum time to wait, in seconds
+        :return: True if all operations are done, False on timeout
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        delays = {id(handle): constants.ASYNC_POLL_DELAY
+                  for handle in handles}
+        polls = {id(handle): monotonic() for handle in handles}
+        pending = [handle for handle in handles if not handle.done]
+
+        while pending:
+            now = monotonic()
+            for handle in pending:
+                key = id(handle)
+                if polls[key] > now:
+                    continue
+                self.async_status(handle)
+                polls[key] = now + random.uniform(
+                    delays[key] / 2, delays[key])
+                delays[key] = min(
+                    delays[key] * 2, constants.ASYNC_POLL_MAX_DELAY)
+
+            pending = [handle for handle in pending if not handle.done]
+            if not pending:
+                break
+
+            wake = min(polls[id(handle)] for handle in pending)
+            if deadline is not None and wake > deadline:
+                return False
+            sleep(max(0, wake - monotonic()))
+        return True
+
     @staticmethod
     def get_attributes(operation, **kwargs):
         # type: (Operation, Any) -> (Text, Any, Dict[Text, Any])
@@ -249,6 +577,77 @@ class API(APIEndpoint):
 
         return data
 
+    def _check_options(self, operation, kwargs):
+        # type: (Optional[Operation], Dict[Text, Any]) -> None
+        """
+        Without `params`, the keyword arguments are the parameters of
+        the operation: refuse those taken as options of the call instead.
+        """
+        if operation or 'params' in kwargs:
+            return
+        options = [name for name in EXECUTE_OPTIONS if name in kwargs]
+        if not options:
+            return
+
+        command = kwargs.get('command')
+        declared = self.operations.get(command, {}).get('params', [])
+        for param in declared:
+            if param['name'] in options:
+                err = ('parameter {!r} of operation {} must be given in '
+                       'params: as a keyword argument, it is an option '
+                       'of the call')
+                raise BadQuery(err.format(param['name'], command))
+
+    def _post(
+        self,
+        operation,  # type: Optional[Operation]
+        void_op,  # type: bool
+        headers,  # type: Optional[Dict[Text, Text]]
+        kwargs,  # type: Dict[Text, Any]
+        adapter=None,  # type: Optional[Text]
+    ):
+        # type: (...) -> Response
+        """ Send the request executing an operation. """
+        extra = {}  # type: Dict[Text, Any]
+        for key in ('enrichers', 'schemas', 'fetch', 'depth'):
+            value = kwargs.pop(key, None)
+            if value:
+                extra[key] = value
+        if adapter:
+            extra['adapter'] = adapter
+
+        command, input_obj, params = self.get_attributes(operation, **kwargs)
+
+        if kwargs.pop('check_params', constants.CHECK_PARAMS):
+            self.check_params(command, params)
+
+        url = 'site/automation/{}'.format(command)
+        if isinstance(input_obj, Blob):
+            url = '{}/upload/{}/{}/execute/{}'.format(
+                self.client.api_path, input_obj.batch_id,
+                input_obj.fileIdx, command)
+            input_obj = None
+
+        headers = headers or {}
+        headers.update(self.headers)
+        if void_op:
+            headers['X-NXVoidOperation'] = 'true'
+
+        data = self.get_params(params)
+
+        if input_obj:
+            if isinstance(input_obj, list):
+                input_obj = 'docs:' + ','.join(input_obj)
+            data['input'] = input_obj
+
+        resp = self.client.request(
+            'POST', url, data=data, headers=headers,
+            default=kwargs.get('default', object), **extra)
+        if (self.missing_cache is not None
+                and command not in READ_ONLY_OPERATIONS):
+            self.missing_cache.clear()
+        return resp
+
     def new(self, command, **kwargs):
         # type: (Text, Any) -> Operation
         """ Make a new Operation object. """
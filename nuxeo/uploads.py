@@ -1,22 +1,35 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
-from .compat import get_bytes, quote, text
-from .constants import CHUNK_LIMIT, MAX_RETRY, UPLOAD_CHUNK_SIZE
+import logging
+from collections import OrderedDict, namedtuple
+from threading import Condition, Lock, Thread
+
+from .compat import Queue, get_bytes, quote, text
+from .constants import (BATCH_POOL_SIZE, CHUNK_LIMIT, MAX_RETRY,
+                        UPLOAD_CHUNK_SIZE)
 from .endpoint import APIEndpoint
-from .exceptions import UploadError
+from .exceptions import InvalidBatch, UploadError
 from .models import Batch, Blob
-from .utils import SwapAttr
 
 try:
     from typing import TYPE_CHECKING
     if TYPE_CHECKING:
-        from typing import Any, Dict, List, Optional, Text, Tuple, Union
+        from typing import (Any, Dict, List, Optional, Set, Text, Tuple,
+                            Union)
         from .client import NuxeoClient
         OptInt = Optional[int]
 except ImportError:
     pass
 
+logger = logging.getLogger(__name__)
+
+# The upload state of a file of a batch: `status` is one of 'completed',
+# 'partial' or 'missing', `chunks` holds the indexes of the chunks
+# already uploaded and `info` the blob details sent by the server
+UploadState = namedtuple(
+    'UploadState', ['file_idx', 'status', 'chunks', 'info'])
+
 
 class API(APIEndpoint):
     """ Endpoint for uploads. """
@@ -62,6 +75,93 @@ class API(APIEndpoint):
 
     batch = post  # Alias for clarity
 
+    def pool(self, batch_size=BATCH_POOL_SIZE):
+        # type: (int) -> BatchPool
+        """
+        Get a pool sharing batches between uploads, see
+        :class:`BatchPool`.
+
+        :param batch_size: the number of files per batch
+        :return: the batch pool
+        """
+        return BatchPool(self, batch_size=batch_size)
+
+    def resume_plan(self, batch_id, blobs):
+        # type: (Text, List[Blob]) -> OrderedDict
+        """
+        Get the upload state of every file of a batch, with a single
+        request.  The states can be given to :func:`upload` to resume
+        the upload of each file without asking for its state:
+
+            >>> plan = nuxeo.uploads.resume_plan(batch.uid, blobs)
+            >>> for idx, blob in enumerate(blobs):
+            ...     nuxeo.uploads.upload(batch, blob, chunked=True,
+            ...                          file_idx=idx, state=plan[idx])
+
+        The files of the server are matched with `blobs`, the files to
+        upload at indexes 0, 1, etc., by their name and size.  When the
+        server does not send their `fileIdx`, a file matching several
+        blobs, or a blob matched by several files, cannot be told apart
+        from the others: such blobs are reported as missing, to be
+        uploaded again.
+
+        :param batch_id: the id of the batch
+        :param blobs: the files to upload in the batch, in order
+        :return: the UploadState of each file, by file index
+        """
+        blobs = list(blobs)
+        infos = {}  # type: Dict[int, Blob]
+        ambiguous = set()  # type: Set[int]
+        for info in self.get(batch_id):
+            if info.fileIdx is not None:
+                file_idx = int(info.fileIdx)
+                if (file_idx >= len(blobs)
+                        or not self._same_file(info, blobs[file_idx])):
+                    # Replaced by the new upload
+                    continue
+            else:
+                # Without its size, a file could be another one of the
+                # same name
+                matches = [idx for idx, blob in enumerate(blobs)
+                           if info.size is not None
+                           and self._same_file(info, blob)]
+                if len(matches) != 1:
+                    ambiguous.update(matches)
+                    continue
+                file_idx = matches[0]
+            if file_idx in infos:
+                ambiguous.add(file_idx)
+            info.batch_id = batch_id
+            info.fileIdx = file_idx
+            infos[file_idx] = info
+
+        for file_idx in ambiguous:
+            infos.pop(file_idx, None)
+
+        plan = OrderedDict()  # type: OrderedDict
+        for file_idx in range(len(blobs)):
+            info = infos.get(file_idx)
+            if info is None:
+                plan[file_idx] = UploadState(file_idx, 'missing', [], None)
+                continue
+            chunks = sorted(int(idx) for idx in info.uploadedChunkIds or [])
+            partial = (info.uploadType == 'chunked'
+                       and len(chunks) < int(info.chunkCount or 0))
+            plan[file_idx] = UploadState(
+                file_idx, 'partial' if partial else 'completed', chunks, info)
+        return plan
+
+    @staticmethod
+    def _same_file(info, blob):
+        # type: (Blob, Blob) -> bool
+        """ Check if the file of a batch is the upload of a blob. """
+        if info.name and info.name not in (
+                blob.name, quote(get_bytes(blob.name))):
+            return False
+        if info.size is None or blob.size is None:
+            return True
+        return int(info.size) == blob.size
+
     def put(self, **kwargs):
         # type: (Any) -> None
         raise NotImplementedError()
@@ -77,13 +177,10 @@ class API(APIEndpoint):
         :param batch_id: the id of the batch
         :param file_idx: the index of the blob
         """
+        target = batch_id
         if file_idx is not None:
             target = '{}/{}'.format(batch_id, file_idx)
-            super(API, self).delete(target)
-        else:
-            target = batch_id
-            with SwapAttr(self, '_cls', Batch):
-                super(API, self).delete(target)
+        super(API, self).delete(target)
 
     def send_data(
         self,
@@ -145,7 +242,12 @@ class API(APIEndpoint):
                  response from the server
         """
         info = super(API, self).get(path, default=None)
+        return self._resume_point(blob, info)
 
+    @staticmethod
+    def _resume_point(blob, info):
+        # type: (Blob, Optional[Blob]) -> Tuple[OptInt, OptInt, OptInt, Blob]
+        """ Where to resume the upload of a blob, see :func:`state`. """
         if info:
             chunk_count = int(info.chunkCount)
             chunk_size = int(info.uploadedSize)
@@ -158,8 +260,16 @@ class API(APIEndpoint):
 
         return chunk_size, chunk_count, index, info
 
-    def upload(self, batch, blob, chunked=False, limit=CHUNK_LIMIT):
-        # type: (Batch, Blob, bool, int) -> Blob
+    def upload(
+        self,
+        batch,  # type: Batch
+        blob,  # type: Blob
+        chunked=False,  # type: bool
+        limit=CHUNK_LIMIT,  # type: int
+        file_idx=None,  # type: Optional[int]
+        state=None,  # type: Optional[UploadState]
+    ):
+        # type: (...) -> Blob
         """
         Upload a blob.
 
@@ -170,12 +280,23 @@ class API(APIEndpoint):
         :param blob: blob to upload
         :param chunked: if True, send in chunks
         :param limit: if blob is bigger, send in chunks
+        :param file_idx: the index of the blob in the batch,
+                         defaults to the next index of the batch
+        :param state: the state of the blob upload, from
+                      :func:`resume_plan`, sparing a request to get it
         :return: uploaded blob details
         """
-        chunked = (chunked or blob.size > limit) and blob.size > 0
+        if file_idx is None:
+            file_idx = batch._upload_idx
+        if state is not None and state.status == 'completed':
+            state.info.batch_id = batch.uid
+            return state.info
+
+        partial = state is not None and state.status == 'partial'
+        chunked = (chunked or partial or blob.size > limit) and blob.size > 0
         response = None
 
-        headers = self.headers
+        headers = dict(self.headers)
         headers.update({
             'Cache-Control': 'no-cache',
             'X-File-Name': quote(get_bytes(blob.name)),
@@ -184,10 +305,14 @@ class API(APIEndpoint):
             'Content-Length': text(blob.size),
         })
 
-        path = '{}/{}'.format(batch.batchId, batch._upload_idx)
+        path = '{}/{}'.format(batch.batchId, file_idx)
 
         if chunked:
-            chunk_size, chunk_count, index, info = self.state(path, blob)
+            if state is not None:
+                chunk_size, chunk_count, index, info = self._resume_point(
+                    blob, state.info)
+            else:
+                chunk_size, chunk_count, index, info = self.state(path, blob)
 
             headers.update({
                 'X-Upload-Type': 'chunked',
@@ -209,8 +334,15 @@ class API(APIEndpoint):
         response.batch_id = batch.uid
         return response
 
-    def execute(self, batch, operation, file_idx=None, params=None):
-        # type: (Batch, Text, Optional[int], Optional[Dict[Text,Any]]) -> Any
+    def execute(
+        self,
+        batch,  # type: Batch
+        operation,  # type: Text
+        file_idx=None,  # type: Optional[int]
+        params=None,  # type: Optional[Dict[Text, Any]]
+        drop=True,  # type: bool
+    ):
+        # type: (...) -> Any
         """
         Execute an operation with the batch or one of its files as an input.
 
@@ -218,6 +350,7 @@ class API(APIEndpoint):
         :param operation: operation to execute
         :param file_idx: if not None, sole input of the operation
         :param params: parameters for the operation
+        :param drop: if False, the server keeps the batch afterwards
         :return: the output of the operation
         """
         path = '{}/{}'.format(self.endpoint, batch.uid)
@@ -226,19 +359,210 @@ class API(APIEndpoint):
 
         path = '{}/execute/{}'.format(path, operation)
 
-        return self.client.request('POST', path, data={'params': params})
+        headers = {} if drop else {'X-Batch-No-Drop': 'true'}
+        return self.client.request(
+            'POST', path, headers=headers, data={'params': params})
 
-    def attach(self, batch, doc, file_idx=None):
-        # type: (Batch, Text, Optional[int]) -> Any
+    def attach(self, batch, doc, file_idx=None, drop=True):
+        # type: (Batch, Text, Optional[int], bool) -> Any
         """
         Attach one or all files of a batch to a document.
 
         :param batch: batch to attach
         :param doc: document to attach
         :param file_idx: if not None, only this file will be attached
+        :param drop: if False, the server keeps the batch afterwards
         :return: the output of the attach operation
         """
         params = {'document': doc}
         if file_idx is None and batch._upload_idx > 1:
             params['xpath'] = 'files:files'
-        return self.execute(batch, 'Blob.Attach', file_idx, params)
+        return self.execute(batch, 'Blob.Attach', file_idx, params, drop=drop)
+
+
+class BatchPool(object):
+    """
+    Share upload batches between files, instead of creating a batch
+    for each of them.
+
+    Each uploaded file takes a slot of the current batch, a new batch
+    being created once `batch_size` slots have been handed out.  Files
+    are attached one by one, the server keeping the batch meanwhile.
+    When all the files of a batch have been attached or released, the
+    batch is dropped in the background.  The pool can be used by
+    several threads at the same time:
+
+        >>> with nuxeo.uploads.pool() as pool:
+        ...     for path, doc in files:
+        ...         blob = pool.upload(FileBlob(path))
+        ...         pool.attach(blob, doc.uid)
+
+    :param uploads: the uploads endpoint
+    :param batch_size: the number of files per batch
+    """
+
+    def __init__(self, uploads, batch_size=BATCH_POOL_SIZE):
+        # type: (API, int) -> None
+        self.uploads = uploads
+        self.batch_size = batch_size
+        self.created = 0
+        self.dropped = 0
+        self._batch = None  # type: Optional[Batch]
+        self._slots = 0
+        self._pending = {}  # type: Dict[Text, Set[int]]
+        self._batches = {}  # type: Dict[Text, Batch]
+        self._lock = Lock()
+        self._creating = False
+        self._created = Condition(self._lock)
+        self._to_drop = Queue()  # type: Queue
+        self._dropper = None  # type: Optional[Thread]
+
+    def __enter__(self):
+        # type: () -> BatchPool
+        return self
+
+    def __exit__(self, *args):
+        # type: (Any) -> None
+        self.close()
+
+    def __repr__(self):
+        # type: () -> Text
+        return '<{} batch_size={} created={} dropped={}>'.format(
+            type(self).__name__, self.batch_size, self.created, self.dropped)
+
+    def upload(self, blob, **kwargs):
+        # type: (Blob, Any) -> Blob
+        """
+        Upload a blob in a slot of the current batch.
+
+        :param blob: the blob to upload
+        :param kwargs: the upload settings, see :func:`API.upload`
+        :return: the blob info, to give to :func:`attach`
+        """
+        batch, file_idx = self._take_slot()
+        try:
+            info = self.uploads.upload(
+                batch, blob, file_idx=file_idx, **kwargs)
+        except Exception:
+            self._release(batch.uid, file_idx)
+            raise
+        info.batch_id = batch.uid
+        info.fileIdx = file_idx
+        return info
+
+    def attach(self, blob, doc):
+        # type: (Blob, Text) -> Any
+        """
+        Attach an uploaded blob to a document, freeing its slot.  When
+        the attach fails, the slot is kept so that it can be retried,
+        :func:`release` frees it.
+
+        :param blob: the blob info returned by :func:`upload`
+        :param doc: the uid or the path of the document
+        :return: the output of the attach operation
+        """
+        batch = self._batches.get(blob.batch_id)
+        if batch is None:
+            raise InvalidBatch(
+                'Cannot attach a blob of a released or dropped batch.')
+        result = self.uploads.attach(
+            batch, doc, file_idx=blob.fileIdx, drop=False)
+        self._release(blob.batch_id, blob.fileIdx)
+        return result
+
+    def release(self, blob):
+        # type: (Blob) -> None
+        """
+        Free the slot of a blob that will not be attached.  Releasing
+        it again does nothing.
+        """
+        self._release(blob.batch_id, blob.fileIdx)
+
+    def close(self):
+        # type: () -> None
+        """
+        Drop the current batch if none of its slots are in use, and
+        wait for the batches being dropped.
+        """
+        with self._lock:
+            batch, self._batch = self._batch, None
+            if batch is not None and not self._pending.get(batch.uid):
+                self._drop(batch.uid)
+        self._to_drop.join()
+
+    def _take_slot(self):
+        # type: () -> Tuple[Batch, int]
+        with self._lock:
+            while self._batch is None or self._slots >= self.batch_size:
+                if not self._creating:
+                    break
+                # Another thread is creating the next batch
+                self._created.wait()
+            else:
+                return self._next_slot()
+            self._creating = True
+
+        # Do not block the other threads during the request
+        try:
+            batch = self.uploads.batch()
+        except Exception:
+            with self._lock:
+                self._creating = False
+                self._created.notify_all()
+            raise
+
+        with self._lock:
+            self._creating = False
+            self._created.notify_all()
+            previous, self._batch, self._slots = self._batch, batch, 0
+            self._batches[batch.uid] = batch
+            self.created += 1
+            if previous is not None and not self._pending.get(previous.uid):
+                self._drop(previous.uid)
+            return self._next_slot()
+
+    def _next_slot(self):
+        # type: () -> Tuple[Batch, int]
+        """ Take the next slot of the current batch, with the lock held. """
+        batch = self._batch
+        file_idx = self._slots
+        self._slots += 1
+        self._pending.setdefault(batch.uid, set()).add(file_idx)
+        return batch, file_idx
+
+    def _release(self, batch_id, file_idx):
+        # type: (Text, int) -> None
+        with self._lock:
+            slots = self._pending.get(batch_id)
+            if not slots or file_idx not in slots:
+                # Already released
+                return
+            slots.discard(file_idx)
+            current = self._batch is not None and self._batch.uid == batch_id
+            if not slots and not current:
+                self._drop(batch_id)
+
+    def _drop(self, batch_id):
+        # type: (Text) -> None
+        """ Queue a batch to be dropped, with the lock held. """
+        self._pending.pop(batch_id, None)
+        self._batches.pop(batch_id, None)
+        if self._dropper is None:
+            self._dropper = Thread(target=self._drop_batches,
+                                   name='batch-pool-dropper')
+            self._dropper.daemon = True
+            self._dropper.start()
+        self._to_drop.put(batch_id)
+
+    def _drop_batches(self):
+        # type: () -> None
+        while True:
+            batch_id = self._to_drop.get()
+            try:
+                self.uploads.delete(batch_id)
+                self.dropped += 1
+            except Exception as exc:
+                logger.warning(
+                    'Cannot drop the batch {!r}: {}'.format(batch_id, exc))
+            finally:
+                self._to_drop.task_done()
@@ -4,6 +4,9 @@ from __future__ import unicode_literals
 import logging
 import mimetypes
 import sys
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+from threading import Event, Lock
 
 import hashlib
 
@@ -11,7 +14,8 @@ try:
     from typing import TYPE_CHECKING
     if TYPE_CHECKING:
         from _hashlib import HASH
-        from typing import Any, Dict, Optional, Text, Type, Union
+        from typing import (Any, Callable, Dict, Iterable, Iterator, List,
+                            Optional, Text, Type, Union)
 except ImportError:
     pass
 
@@ -31,6 +35,22 @@ WIN32_PATCHED_MIME_TYPES = {
 }
 
 
+def chunks(items, size):
+    # type: (Iterable[Any], int) -> Iterator[List[Any]]
+    """
+    Split an iterable into lists of at most `size` elements.
+
+    :param items: the iterable to split
+    :param size: the maximum size of each list
+    """
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def get_digest_algorithm(digest):
     # type: (Text) -> Optional[Text]
 
@@ -102,6 +122,97 @@ def json_helper(obj):
     return obj.to_json()
 
 
+def nxql_quote(value):
+    # type: (Text) -> Text
+    """ Quote a value to be safely used as a NXQL string literal. """
+    return "'{}'".format(value.replace('\\', '\\\\').replace("'", "\\'"))
+
+
+def parallel_map(func, items, workers=1):
+    # type: (Callable[[Any], Any], Iterable[Any], int) -> List[Any]
+    """
+    Apply `func` to every item using a pool of threads.
+
+    Results are returned in the same order as `items`.  The first
+    exception raised by `func` is re-raised in the calling thread.
+
+    :param func: the function to call
+    :param items: the arguments to pass to `func`, one at a time
+    :param workers: the maximum number of concurrent calls
+    :return: the results of every call
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class SingleFlight(object):
+    """
+    Collapse concurrent calls sharing the same key into one call, its
+    result (or exception) being returned to every caller:
+
+        >>> flight = SingleFlight()
+        >>> # In several threads at the same time
+        >>> flight.do('catalog', fetch_catalog)
+
+    The number of calls spared is kept in `saved`.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self.saved = 0
+        self._calls = {}  # type: Dict[Any, _Call]
+        self._lock = Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        # type: (Any, Callable[..., Any], Any, Any) -> Any
+        """
+        Call `func` unless a call with the same key is in progress,
+        in which case wait for it and return its result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.saved += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class _Call(object):
+    """ A call in progress, see :class:`SingleFlight`. """
+
+    def __init__(self):
+        # type: () -> None
+        self.done = Event()
+        self.result = None  # type: Any
+        self.error = None  # type: Optional[Exception]
+
+
 class SwapAttr(object):
     """
     Context manager to swap an attribute's value:
@@ -0,0 +1,65 @@
+# coding: utf-8
+"""
+Compare the cost of operations parameters validation: the previous
+implementation, walking the catalog entry on each call, against the
+precompiled validators.
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import timeit
+
+from nuxeo.client import Nuxeo
+from nuxeo.exceptions import BadQuery
+from nuxeo.operations import PARAM_TYPES
+
+CALLS = 100000
+CASES = [
+    ('Document.Query', {'query': 'SELECT * FROM Document', 'pageSize': 10}),
+    ('Document.AddPermission', {'permission': 'Read', 'username': 'bob',
+                                'blockInheritance': False}),
+    ('Document.Create', {'type': 'File', 'name': 'foo',
+                         'properties': {'dc:title': 'foo'}}),
+]
+
+
+def legacy_check_params(server, command, params):
+    operation = server.operations.operations.get(command)
+    if not operation:
+        raise BadQuery(command)
+
+    parameters = {param['name']: param for param in operation['params']}
+    for name, value in params.items():
+        param = parameters.pop(name)
+        types_accepted, default = PARAM_TYPES[param['type']]
+        if not param['required']:
+            types_accepted += (type(default),)
+        types_accepted = tuple(set(types_accepted))
+        if not isinstance(value, types_accepted):
+            raise BadQuery(name)
+
+    for (name, parameter) in parameters.items():
+        if parameter['required']:
+            raise BadQuery(name)
+
+
+def run_test(server):
+    for command, params in CASES:
+        # Warm up the catalog and the validator
+        server.operations.check_params(command, params)
+
+        before = timeit.timeit(
+            lambda: legacy_check_params(server, command, params),
+            number=CALLS)
+        after = timeit.timeit(
+            lambda: server.operations.check_params(command, params),
+            number=CALLS)
+        print('{:<24} before: {:.2f} µs/call, after: {:.2f} µs/call'.format(
+            command, before / CALLS * 1e6, after / CALLS * 1e6))
+
+
+if __name__ == '__main__':
+    server = Nuxeo(host=os.environ.get('NXDRIVE_TEST_NUXEO_URL',
+                                       'http://localhost:8080/nuxeo'),
+                   auth=('Administrator', 'Administrator'))
+    run_test(server)
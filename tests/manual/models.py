@@ -0,0 +1,65 @@
+# coding: utf-8
+"""
+Measure the parsing speed and the memory footprint of models, without
+any server: objects parsed per second and bytes per instance.
+"""
+from __future__ import print_function, unicode_literals
+
+import gc
+import timeit
+
+from nuxeo.models import Blob, Document
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+COUNT = 100000
+DOCUMENT = {
+    'entity-type': 'document',
+    'repository': 'default',
+    'uid': '5c61a8b1-e1e1-4a3a-8d1e-3e3bb2cbd6c8',
+    'path': '/default-domain/workspaces/ws/file',
+    'type': 'File',
+    'state': 'project',
+    'parentRef': '1b1f5c5e-0d79-4bd6-8d6d-1fb6d8a0bd64',
+    'isCheckedOut': True,
+    'isVersion': False,
+    'isProxy': False,
+    'changeToken': '1-0',
+    'isTrashed': False,
+    'title': 'file',
+    'lastModified': '2018-09-04T12:00:00.000Z',
+    'properties': {'dc:title': 'file', 'dc:description': None},
+    'facets': ['Versionable', 'Commentable', 'Downloadable'],
+    'schemas': [{'name': 'dublincore', 'prefix': 'dc'}],
+}
+BLOB = {
+    'name': 'file.txt',
+    'uploadType': 'normal',
+    'uploadedSize': '42',
+    'fileIdx': '0',
+}
+
+
+def bench(cls, payload):
+    seconds = timeit.timeit(lambda: cls.parse(payload), number=COUNT)
+
+    size = None
+    if tracemalloc:
+        gc.collect()
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        objects = [cls.parse(payload) for _ in range(COUNT)]
+        size = (tracemalloc.get_traced_memory()[0] - start) / len(objects)
+        tracemalloc.stop()
+
+    print('{:<10} {:>10.0f} objects/s, {} bytes/instance'.format(
+        cls.__name__, COUNT / seconds,
+        'n/a' if size is None else '{:.0f}'.format(size)))
+
+
+if __name__ == '__main__':
+    bench(Document, DOCUMENT)
+    bench(Blob, BLOB)
@@ -34,6 +34,32 @@ def get_batch(server):
     return batch
 
 
+def test_batch_pool(server):
+    docs = [server.documents.create(
+        Document(name='pool-{}'.format(idx), type='File',
+                 properties={'dc:title': 'pool-{}'.format(idx)}),
+        parent_path=pytest.ws_root_path) for idx in range(3)]
+    try:
+        with server.uploads.pool(batch_size=2) as pool:
+            blobs = [pool.upload(BufferBlob(data='data', name='pool.txt'))
+                     for _ in docs]
+            assert [blob.fileIdx for blob in blobs] == [0, 1, 0]
+            assert blobs[0].batch_id == blobs[1].batch_id
+            assert blobs[2].batch_id != blobs[0].batch_id
+            for blob, doc in zip(blobs, docs):
+                pool.attach(blob, doc.uid)
+
+            # Releasing an attached blob does nothing
+            pool.release(blobs[0])
+            assert pool.created == 2
+        assert pool.dropped == 2
+        for doc in docs:
+            assert doc.fetch_blob() == b'data'
+    finally:
+        for doc in docs:
+            doc.delete()
+
+
 def test_cancel(server):
     batch = get_batch(server)
     batch.cancel()
@@ -163,6 +189,37 @@ def test_operation(server):
         doc.delete()
 
 
+def test_resume_plan(server):
+    blobs = [BufferBlob(data='data', name='Test{}.txt'.format(idx), size=4)
+             for idx in range(4)]
+    batch = server.uploads.batch()
+    for file_idx in (0, 2):
+        server.uploads.upload(batch, blobs[file_idx], file_idx=file_idx)
+
+    # The file missing in the middle does not shift the others
+    plan = batch.resume_plan(blobs)
+    assert list(plan) == [0, 1, 2, 3]
+    assert [state.status for state in plan.values()] == [
+        'completed', 'missing', 'completed', 'missing']
+    assert plan[2].info.fileIdx == 2
+
+    # Without file indexes, identical files cannot be told apart
+    infos = server.uploads.get(batch.uid)
+    for info in infos:
+        info.fileIdx = None
+    twins = [blobs[0], blobs[0], blobs[2]]
+    with SwapAttr(server.uploads, 'get', lambda *args: infos):
+        plan = server.uploads.resume_plan(batch.uid, twins)
+    assert [state.status for state in plan.values()] == [
+        'missing', 'missing', 'completed']
+
+    # Completed files are not sent again
+    blob = server.uploads.upload(batch, blobs[0], file_idx=0, state=plan[0])
+    assert blob is plan[0].info
+    assert blob.batch_id == batch.uid
+    batch.cancel()
+
+
 @pytest.mark.parametrize('chunked', [False, True])
 def test_upload(chunked, server):
     batch = server.uploads.batch()
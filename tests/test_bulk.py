@@ -0,0 +1,37 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+from nuxeo.models import BulkStatus, Document
+
+
+def test_bulk_set_properties(server):
+    parent = server.documents.create(
+        Document(name='bulk', type='Folder', properties={'dc:title': 'bulk'}),
+        parent_path='/default-domain/workspaces')
+    try:
+        for idx in range(3):
+            server.documents.create(
+                Document(name='doc{}'.format(idx), type='Note',
+                         properties={'dc:title': 'doc'}),
+                parent_path=parent.path)
+
+        query = "SELECT * FROM Note WHERE ecm:parentId = '{}'".format(
+            parent.uid)
+        status = server.bulk.run(
+            'setProperties', query, params={'dc:description': 'bulk'})
+        assert isinstance(status, BulkStatus)
+        assert status.uid
+        assert repr(status)
+
+        seen = []
+        assert status.wait(timeout=60, callback=seen.append)
+        assert status.state == 'COMPLETED'
+        assert status.progress == 1.0
+        assert server.bulk.get(status.uid).state == 'COMPLETED'
+
+        children = server.documents.get_children(uid=parent.uid)
+        assert len(children) == 3
+        assert all(child.properties['dc:description'] == 'bulk'
+                   for child in children)
+    finally:
+        parent.delete()
@@ -0,0 +1,134 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+
+from nuxeo.cache import DiskCache, DocumentCache, LRUCache, PathCache
+from nuxeo.models import Document
+from nuxeo.utils import parallel_map
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2, ttl=None)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)  # Evicts 'b', the least recently used
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.pop('c') == 3
+    assert repr(cache)
+    assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 1, 'size': 1}
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+
+def test_disk_cache():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = DiskCache(directory)
+        assert cache.get('key') is None
+        cache.set('key', {'etag': '"1"', 'content': b'\x00data'})
+        assert repr(cache)
+        assert DiskCache(directory).get('key') == {
+            'etag': '"1"', 'content': b'\x00data'}
+        assert cache.pop('key')
+        assert cache.get('key') is None
+    finally:
+        shutil.rmtree(directory)
+
+
+
+def test_disk_cache_concurrent_set():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = DiskCache(directory)
+
+        def set_many(idx):
+            for value in range(100):
+                cache.set('key', {'value': value})
+            return idx
+
+        assert parallel_map(set_many, range(4), 4) == list(range(4))
+        assert cache.get('key') == {'value': 99}
+        assert len(os.listdir(directory)) == 1
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_document_cache():
+    cache = DocumentCache(maxsize=10)
+    folder = Document(uid='1', path='/folder', changeToken='0')
+    child = Document(uid='2', path='/folder/child', changeToken='0',
+                     properties={'dc:title': 'child'})
+    cache.add(folder)
+    cache.add(child)
+    assert len(cache) == 2
+    assert cache.get(uid='2').properties['dc:title'] == 'child'
+    assert cache.get(path='/folder/child').uid == '2'
+
+    # Each hit is a new document, changes made to it are not shared
+    doc = cache.get(uid='2')
+    assert doc is not child
+    assert doc is not cache.get(uid='2')
+    doc.properties['dc:title'] = 'changed'
+    child.properties['dc:title'] = 'changed'
+    assert cache.get(uid='2').properties['dc:title'] == 'child'
+    assert not cache.get(uid='2').properties.dirty
+
+    # Same change token, the cached document is kept
+    cache.refresh(Document(uid='2', path='/folder/child', changeToken='0'))
+    assert cache.get(uid='2').properties['dc:title'] == 'child'
+
+    # Another change token, the cached document is stale
+    fresh = Document(uid='2', path='/folder/child', changeToken='1')
+    cache.refresh(fresh)
+    assert cache.get(uid='2').changeToken == '1'
+    assert cache.stats['stale'] == 1
+
+    # Documents fetched with other settings are kept apart
+    other = Document(uid='1', path='/folder', changeToken='2')
+    cache.add(other, scope='other')
+    assert cache.get(uid='1', scope='other').changeToken == '2'
+    assert cache.get(uid='1').changeToken == '0'
+
+    # Discarding a folder discards its children too, in all scopes
+    cache.discard('1')
+    assert not cache.get(uid='2')
+    assert not cache.get(path='/folder/child')
+    assert not cache.get(uid='1', scope='other')
+    assert not len(cache)
+
+
+def test_path_cache():
+    cache = PathCache(maxsize=10)
+    cache.add('/folder/', '1')
+    cache.add('/folder/child', '2')
+    cache.add('/folderish', '3')
+    assert cache.get('/folder') == '1'
+    assert cache.get('/folder/child/') == '2'
+
+    # A renamed document is reachable by its new path only
+    cache.add('/folderish-renamed', '3')
+    assert not cache.get('/folderish')
+    assert cache.get('/folderish-renamed') == '3'
+
+    # Discarding a folder forgets its children too, and only them
+    cache.discard('1')
+    assert not cache.get('/folder')
+    assert not cache.get('/folder/child')
+    assert cache.get('/folderish-renamed') == '3'
+    assert len(cache) == 1
+
+    # Paths of other repositories are kept apart
+    cache.add('/folderish-renamed', '4', scope='other')
+    assert cache.get('/folderish-renamed', scope='other') == '4'
+    assert cache.get('/folderish-renamed') == '3'
@@ -0,0 +1,71 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import time
+
+import pytest
+
+from nuxeo.cache import LRUCache
+from nuxeo.models import Document
+
+
+def test_change_feed(server):
+    store = LRUCache(ttl=None)
+    feed = server.documents.change_feed(
+        root='/default-domain/workspaces', store=store)
+    assert not list(feed.poll())
+    cursor = feed.cursor
+    assert cursor is not None
+
+    doc = server.documents.create(
+        Document(name='changes', type='Note', properties={'dc:title': 'a'}),
+        parent_path='/default-domain/workspaces')
+    try:
+        doc.set({'dc:title': 'b'})
+        doc.save()
+    finally:
+        doc.delete()
+
+    # XXX: Replace with NuxeoDrive.WaitForElasticsearchCompletion
+    time.sleep(1)
+
+    # A new feed resumes from the saved cursor
+    feed = server.documents.change_feed(
+        root='/default-domain/workspaces', store=store)
+    assert feed.cursor == cursor
+    changes = [change for change in feed.poll() if change.uid == doc.uid]
+    if not changes:
+        pytest.xfail('No enough time for the Audit Log.')
+
+    assert changes[0].kind == 'created'
+    assert changes[0].path == doc.path
+    assert 'modified' in [change.kind for change in changes]
+    assert feed.cursor > cursor
+    assert not list(feed.poll())
+
+
+def test_change_feed_move_out(server):
+    folder = server.documents.create(
+        Document(name='changes', type='Folder',
+                 properties={'dc:title': 'changes'}),
+        parent_path='/default-domain/workspaces')
+    try:
+        doc = server.documents.create(
+            Document(name='note', type='Note', properties={'dc:title': 'a'}),
+            parent_path=folder.path)
+        feed = server.documents.change_feed(root=folder.path)
+        feed.reset()
+        server.documents.move(doc.uid, '/default-domain/workspaces')
+
+        # XXX: Replace with NuxeoDrive.WaitForElasticsearchCompletion
+        time.sleep(1)
+
+        # The move is returned even if the document left the root
+        changes = [change for change in feed.poll() if change.uid == doc.uid]
+        if not changes:
+            pytest.xfail('No enough time for the Audit Log.')
+        assert changes[-1].kind == 'moved'
+        assert changes[-1].path == '/default-domain/workspaces/note'
+        server.documents.delete(doc.uid)
+    finally:
+        folder.delete()
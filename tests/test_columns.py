@@ -0,0 +1,50 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import shutil
+import tempfile
+
+import pytest
+
+from nuxeo.columns import Columns
+from nuxeo.exceptions import BadQuery
+
+
+def rows():
+    for idx in range(10):
+        yield 'doc-{}'.format(idx % 3), idx if idx % 4 else None
+
+
+def test_columns():
+    columns = Columns(['ecm:uuid', 'size'], types={'size': 'l'})
+    for row in rows():
+        columns.append(row)
+    assert len(columns) == 10
+    assert repr(columns)
+    assert list(columns['ecm:uuid'])[:4] == ['doc-0', 'doc-1', 'doc-2',
+                                             'doc-0']
+    assert list(columns['size']) == [0, 1, 2, 3, 0, 5, 6, 7, 0, 9]
+
+
+def test_columns_spill():
+    directory = tempfile.mkdtemp()
+    try:
+        columns = Columns(['ecm:uuid', 'size'], types={'size': 'd'},
+                          directory=directory, spill_rows=3)
+        for row in rows():
+            columns.append(row)
+        columns.spill()
+
+        loaded = Columns.load(directory)
+        assert len(loaded) == 10
+        assert list(loaded['ecm:uuid']) == list(columns['ecm:uuid'])
+        sizes = list(loaded['size'])
+        assert sizes[1:4] == [1.0, 2.0, 3.0]
+        assert sizes[0] != sizes[0]  # NaN
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_columns_unknown_type():
+    with pytest.raises(BadQuery):
+        Columns(['ecm:uuid'], types={'size': 'l'})
@@ -4,6 +4,7 @@ from __future__ import unicode_literals
 import pytest
 
 from nuxeo.compat import get_bytes
+from nuxeo.exceptions import HTTPError
 from nuxeo.models import BufferBlob, Document
 
 
@@ -76,6 +77,29 @@ def test_document_create_bytes_warning(server):
             server.documents.delete(document['uid'])
 
 
+def test_document_parse():
+    doc = Document.parse({
+        'entity-type': 'document',
+        'uid': '1234',
+        'alien': 'ignored',
+        'properties': {'dc:title': 'foo'},
+    })
+    assert doc.entity_type == 'document'
+    assert doc.uid == '1234'
+    assert doc.path is None
+
+    # Properties are wrapped on first access only
+    assert doc._properties is None
+    assert doc.properties == {'dc:title': 'foo'}
+    assert doc.properties is doc.properties
+    assert not doc.properties.dirty
+
+    # Documents are slotted: no arbitrary attributes
+    assert not hasattr(doc, '__dict__')
+    with pytest.raises(AttributeError):
+        doc.alien = 'alien'
+
+
 def test_document_get_blobs(server):
     """ Fetch all blobs of a given document. """
 
@@ -119,6 +143,24 @@ def test_document_list_update(server):
     doc2.delete()
 
 
+def test_document_partial_update(server):
+    with Doc(server) as doc:
+        assert not doc.properties.dirty
+        doc.set({'dc:description': 'partial'})
+        assert doc.properties.changes() == {'dc:description': 'partial'}
+
+        updated = server.documents.put(doc, partial=True)
+        assert not doc.properties.dirty
+        assert updated.properties['dc:description'] == 'partial'
+        assert updated.properties['dc:title'] == 'bar.txt'
+
+        # The server refuses updates based on an outdated document
+        doc.properties['dc:title'] = 'outdated'
+        with pytest.raises(HTTPError) as e:
+            server.documents.put(doc, check_change_token=True)
+        assert e.value.status == 409
+
+
 def test_document_move(server):
     doc = Document(
         name=pytest.ws_python_test_name,
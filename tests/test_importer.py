@@ -0,0 +1,40 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+from nuxeo.cache import LRUCache
+from nuxeo.importer import Importer
+from nuxeo.models import Document
+
+
+def test_importer(server, tmpdir):
+    source = tmpdir.mkdir('source')
+    source.mkdir('folder').mkdir('sub').join('deep.txt').write('deep')
+    source.join('folder', 'file.txt').write('file')
+    source.join('top.txt').write('top')
+
+    target = server.documents.create(
+        Document(name='import', type='Folder',
+                 properties={'dc:title': 'import'}),
+        parent_path='/default-domain/workspaces')
+    try:
+        store = LRUCache(ttl=None)
+        progress = []
+        importer = Importer(server, str(source), target.path, store=store,
+                            callback=progress.append)
+        stats = importer.run()
+        assert not stats.errors
+        assert (stats.folders, stats.files) == (2, 3)
+        assert stats.bytes == 11
+        assert len(progress) == 3
+        assert repr(importer)
+
+        folder = server.documents.get(path=target.path + '/folder')
+        deep = server.documents.get(path=folder.path + '/sub/deep.txt')
+        assert deep.fetch_blob() == b'deep'
+
+        # Everything is skipped when resuming a finished import
+        stats = Importer(server, str(source), target.path, store=store).run()
+        assert (stats.folders, stats.files, stats.skipped) == (0, 0, 5)
+        assert len(server.documents.get_children(uid=target.uid)) == 2
+    finally:
+        target.delete()
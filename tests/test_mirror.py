@@ -0,0 +1,172 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import time
+
+import pytest
+
+from nuxeo.mirror import Mirror
+from nuxeo.models import Document
+from nuxeo.utils import SwapAttr
+
+
+def test_mirror(server, tmpdir):
+    root = server.documents.create(
+        Document(name='mirror', type='Folder',
+                 properties={'dc:title': 'mirror'}),
+        parent_path='/default-domain/workspaces')
+    try:
+        note = server.documents.create(
+            Document(name='note', type='Note', properties={'dc:title': 'a'}),
+            parent_path=root.path)
+
+        database = str(tmpdir.join('mirror.db'))
+        mirror = Mirror(server.documents, database, root=root.path,
+                        properties=['dc:title'])
+        assert mirror.load() == 2
+        assert mirror.get(note.uid)['dc:title'] == 'a'
+        assert [doc['uid'] for doc in mirror.children(root.path)] == [
+            note.uid]
+        assert mirror.find(type='Note', where={'dc:title': 'a'})
+        assert not mirror.find(path=root.path, type='Folder')
+        mirror.close()
+
+        note.set({'dc:title': 'b'})
+        note.save()
+        server.documents.create(
+            Document(name='other', type='Note',
+                     properties={'dc:title': '[1, 2]'}),
+            parent_path=root.path)
+
+        # XXX: Replace with NuxeoDrive.WaitForElasticsearchCompletion
+        time.sleep(1)
+
+        # The cursor was saved in the database
+        mirror = Mirror(server.documents, database, root=root.path,
+                        properties=['dc:title'])
+        if not mirror.sync():
+            pytest.xfail('No enough time for the Audit Log.')
+        assert mirror.get(note.uid)['dc:title'] == 'b'
+        assert len(mirror) == 3
+
+        # Strings looking like JSON stay strings
+        found = mirror.find(where={'dc:title': '[1, 2]'})
+        assert [doc['dc:title'] for doc in found] == ['[1, 2]']
+        mirror.close()
+    finally:
+        root.delete()
+
+
+def test_mirror_sync_failure(server, tmpdir):
+    root = server.documents.create(
+        Document(name='mirror', type='Folder',
+                 properties={'dc:title': 'mirror'}),
+        parent_path='/default-domain/workspaces')
+    try:
+        note = server.documents.create(
+            Document(name='note', type='Note', properties={'dc:title': 'a'}),
+            parent_path=root.path)
+        mirror = Mirror(server.documents, str(tmpdir.join('mirror.db')),
+                        root=root.path, properties=['dc:title'])
+        mirror.load()
+        cursor = mirror.feed.cursor
+
+        note.set({'dc:title': 'b'})
+        note.save()
+
+        # XXX: Replace with NuxeoDrive.WaitForElasticsearchCompletion
+        time.sleep(1)
+
+        def query_rows(*args, **kwargs):
+            raise ValueError('Mock error')
+
+        # The failed batch is rolled back, along with the cursor
+        with SwapAttr(server.documents, 'query_rows', query_rows):
+            with pytest.raises(ValueError):
+                mirror.sync()
+        assert mirror.feed.cursor == cursor
+        assert mirror.get(note.uid)['dc:title'] == 'a'
+
+        if not mirror.sync():
+            pytest.xfail('No enough time for the Audit Log.')
+        assert mirror.get(note.uid)['dc:title'] == 'b'
+        mirror.close()
+    finally:
+        root.delete()
+
+
+def test_mirror_moves(server, tmpdir):
+    workspaces = '/default-domain/workspaces'
+    root = server.documents.create(
+        Document(name='mirror', type='Folder',
+                 properties={'dc:title': 'mirror'}),
+        parent_path=workspaces)
+    outside = server.documents.create(
+        Document(name='outside', type='Folder',
+                 properties={'dc:title': 'outside'}),
+        parent_path=workspaces)
+    try:
+        note = server.documents.create(
+            Document(name='note', type='Note', properties={'dc:title': 'a'}),
+            parent_path=root.path)
+        child = server.documents.create(
+            Document(name='child', type='Note', properties={'dc:title': 'b'}),
+            parent_path=outside.path)
+        mirror = Mirror(server.documents, str(tmpdir.join('mirror.db')),
+                        root=root.path)
+        assert mirror.load() == 2
+
+        server.documents.move(note.uid, workspaces)
+        server.documents.move(outside.uid, root.path)
+
+        # XXX: Replace with NuxeoDrive.WaitForElasticsearchCompletion
+        time.sleep(1)
+
+        if not mirror.sync():
+            pytest.xfail('No enough time for the Audit Log.')
+        assert not mirror.get(note.uid)
+        assert mirror.get(outside.uid)['path'] == root.path + '/outside'
+        assert mirror.get(child.uid)['path'] == root.path + '/outside/child'
+        mirror.close()
+        server.documents.delete(note.uid)
+    finally:
+        root.delete()
+
+
+def test_mirror_trash(server, tmpdir):
+    root = server.documents.create(
+        Document(name='mirror', type='Folder',
+                 properties={'dc:title': 'mirror'}),
+        parent_path='/default-domain/workspaces')
+    try:
+        note = server.documents.create(
+            Document(name='note', type='Note', properties={'dc:title': 'a'}),
+            parent_path=root.path)
+        trashed = server.documents.create(
+            Document(name='trashed', type='Note',
+                     properties={'dc:title': 'a'}),
+            parent_path=root.path)
+        server.documents.trash(trashed.uid)
+
+        # Trashed documents are not loaded
+        mirror = Mirror(server.documents, str(tmpdir.join('mirror.db')),
+                        root=root.path)
+        assert mirror.load() == 2
+        assert not mirror.get(trashed.uid)
+
+        # Nor added back when modified after being trashed
+        server.documents.trash(note.uid)
+        note = server.documents.get(uid=note.uid)
+        note.set({'dc:title': 'b'})
+        note.save()
+
+        # XXX: Replace with NuxeoDrive.WaitForElasticsearchCompletion
+        time.sleep(1)
+
+        if not mirror.sync():
+            pytest.xfail('No enough time for the Audit Log.')
+        assert not mirror.get(note.uid)
+        assert len(mirror) == 1
+        mirror.close()
+    finally:
+        root.delete()
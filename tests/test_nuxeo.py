@@ -10,10 +10,13 @@ from requests.exceptions import ConnectionError
 
 from nuxeo import constants
 from nuxeo.auth import TokenAuth
+from nuxeo.cache import LRUCache
+from nuxeo.client import NuxeoClient
 from nuxeo.compat import get_bytes, long, text
 from nuxeo.exceptions import BadQuery, HTTPError, Unauthorized
 from nuxeo.models import Blob, User
 from nuxeo.utils import SwapAttr
+from .server import Server, consume_socket
 
 
 @pytest.mark.parametrize('method, params, is_valid', [
@@ -99,6 +102,18 @@ def test_check_params_constant(server):
             operation.execute()
 
 
+def test_check_params_validator(server):
+    params = {'query': 'SELECT * FROM Document'}
+    server.operations.check_params('Document.Query', params)
+    key = (server.client.host, server.client.server_version)
+    validator = server.operations.validators[key]['Document.Query']
+    assert 'query' in validator.required
+
+    # The validator is built only once
+    server.operations.check_params('Document.Query', params)
+    assert server.operations.validators[key]['Document.Query'] is validator
+
+
 def test_check_params_unknown_operation(server):
     with pytest.raises(BadQuery):
         server.operations.check_params('alien', {})
@@ -151,6 +166,46 @@ def test_get_operations(server):
     assert server.operations
 
 
+def test_http_cache(server):
+    responses = [
+        ('HTTP/1.1 200 OK\r\nETag: "1"\r\n'
+         'Content-Type: application/json\r\n'
+         'Content-Length: 15\r\n\r\n{"foo": "bar"}\n'),
+        'HTTP/1.1 304 Not Modified\r\nETag: "1"\r\n\r\n',
+    ]
+    requests_content = []
+
+    def handler(sock):
+        requests_content.append(consume_socket(sock))
+        sock.send(get_bytes(responses.pop(0)))
+        sock.close()
+
+    with Server(handler, requests_to_handle=2, fail_args={}) as serv:
+        client = NuxeoClient(host='http://localhost:{}/'.format(serv.port),
+                             http_cache=LRUCache())
+        assert client.request('GET', 'api/v1/me').json() == {'foo': 'bar'}
+        resp = client.request('GET', 'api/v1/me')
+        assert resp.status_code == 200
+        assert resp.json() == {'foo': 'bar'}
+
+    assert b'If-None-Match: "1"' not in requests_content[0]
+    assert b'If-None-Match: "1"' in requests_content[1]
+
+
+def test_identity():
+    client = NuxeoClient(auth=('Administrator', 'secret'))
+    assert client.identity == 'user:Administrator'
+    assert 'secret' not in client.identity
+
+    client.auth = requests.auth.HTTPBasicAuth('Administrator', 'secret')
+    assert client.identity == 'user:Administrator'
+
+    # Stable across instances, but not the token itself
+    client.auth = TokenAuth('token')
+    assert client.identity == NuxeoClient(auth=TokenAuth('token')).identity
+    assert 'token' not in client.identity.split(':', 1)[1]
+
+
 def test_query(server):
     search = server.client.query('SELECT * FROM Domain')
     assert search['entries']
@@ -3,8 +3,10 @@ from __future__ import unicode_literals
 
 import pytest
 
+from nuxeo.cache import DiskCache
 from nuxeo.compat import text
-from nuxeo.exceptions import BadQuery, HTTPError
+from nuxeo.exceptions import BadQuery, HTTPError, OperationBatchError
+from nuxeo.utils import SwapAttr
 
 
 def test_document_fetch_by_property(server):
@@ -58,3 +60,132 @@ def test_params_setter(server):
     assert params['param1'] == 'bar'
     assert params['param2'] == 'bar'
     assert params['param3'] == 'plop'
+
+
+def test_operations_catalog_cache(server, tmpdir):
+    cache = DiskCache(str(tmpdir))
+    key = (server.client.host, server.client.server_version)
+    catalogs = {}
+
+    with SwapAttr(server.operations, 'catalogs', catalogs), \
+            SwapAttr(server.operations, 'cache', cache):
+        ops = server.operations.operations
+        assert 'Document.Query' in ops
+        assert catalogs[key] is ops
+
+        # A new process would find the catalog on disk
+        catalogs.clear()
+        with SwapAttr(server.operations, 'get', None):
+            assert server.operations.operations == ops
+        assert cache.hits == 1
+
+
+def test_operations_unknown_version(server):
+    ops = server.operations.operations
+    calls = []
+
+    def request(*args, **kwargs):
+        calls.append(args)
+        return {}
+
+    # The server version cannot be fetched, it is not asked again
+    with SwapAttr(server.operations, '_server_key', None), \
+            SwapAttr(server.client, '_server_info', {}), \
+            SwapAttr(server.client, 'request', request), \
+            SwapAttr(server.operations, 'catalogs',
+                     {(server.client.host, ''): ops}):
+        for _ in range(3):
+            server.operations.check_params('Document.Fetch', {'value': '/'})
+    assert len(calls) == 1
+
+
+def test_execute_options_clash(server):
+    ops = dict(server.operations.operations)
+    ops['Alien.Fetch'] = {
+        'id': 'Alien.Fetch',
+        'params': [{'name': 'depth', 'type': 'string', 'required': False}],
+    }
+
+    # Such parameters would be taken as options of the call
+    with SwapAttr(server.operations, 'catalogs',
+                  {server.operations._server(): ops}):
+        with pytest.raises(BadQuery):
+            server.operations.execute(command='Alien.Fetch', depth='max')
+
+
+def test_chain(server):
+    chain = server.operations.chain(input_obj='/default-domain/workspaces')
+    chain.add('Document.Create', type='File', name='chain',
+              properties={'dc:title': 'chain'})
+    chain.add('Document.SetProperty', xpath='dc:description', value='piped')
+    assert len(chain) == 2
+    assert repr(chain)
+
+    created, updated = chain.execute()
+    try:
+        assert created['entity-type'] == 'document'
+        assert updated['uid'] == created['uid']
+        assert updated['properties']['dc:description'] == 'piped'
+    finally:
+        server.documents.delete(created['uid'])
+
+
+def test_chain_check_params(server):
+    chain = server.operations.chain(input_obj='/default-domain/workspaces')
+    chain.add('Document.Create', type='File', name='chain')
+    chain.add('Document.SetProperty', alien='alien')
+
+    # Nothing is created as the second step is invalid
+    with pytest.raises(BadQuery):
+        chain.execute()
+    assert not server.documents.exists(
+        path='/default-domain/workspaces/chain')
+
+
+def test_chain_not_piped(server):
+    chain = server.operations.chain()
+    chain.add('Repository.ResultSetQuery',
+              query='SELECT ecm:uuid FROM Document', pageSize=1)
+    chain.add('Document.SetProperty', xpath='dc:description', value='piped')
+
+    # Rows cannot be the input of the next operation
+    with pytest.raises(BadQuery):
+        chain.execute()
+
+
+def test_execute_async(server):
+    handle = server.operations.execute_async(
+        command='Document.Query', params={'query': 'SELECT * FROM Domain'})
+    assert handle.execution_id
+    assert handle.status()
+
+    assert handle.wait(timeout=30)
+    assert handle.done
+    assert handle.status() == 'COMPLETED'
+    res = handle.result()
+    assert res['entity-type'] == 'documents'
+    assert res['entries']
+
+
+def test_execute_async_wait_all(server):
+    handles = [server.operations.execute_async(
+        command='Document.Query', params={'query': 'SELECT * FROM Domain'})
+        for _ in range(3)]
+    assert server.operations.wait_all(handles, timeout=30)
+    assert all(handle.done for handle in handles)
+
+
+def test_execute_batches(server):
+    paths = ['/default-domain/workspaces', '/default-domain/sections',
+             '/default-domain/templates']
+    res = server.operations.execute(
+        command='Document.GetParent', input_obj=paths, batch_size=1)
+    assert res['entity-type'] == 'documents'
+    assert [doc['path'] for doc in res['entries']] == ['/default-domain'] * 3
+
+    with pytest.raises(OperationBatchError) as e:
+        server.operations.execute(
+            command='Document.GetParent', input_obj=paths + ['/alien'],
+            batch_size=2)
+    assert len(e.value.result['entries']) == 2
+    assert e.value.failures[0][0] == ['/default-domain/templates', '/alien']
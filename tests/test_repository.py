@@ -6,9 +6,11 @@ import time
 
 import pytest
 
+from nuxeo.cache import DocumentCache, LRUCache, PathCache
 from nuxeo.compat import get_bytes, text
 from nuxeo.exceptions import BadQuery, HTTPError, UnavailableConvertor
 from nuxeo.models import BufferBlob, Document
+from nuxeo.utils import SwapAttr
 
 
 class Doc(object):
@@ -134,6 +136,31 @@ def test_create_doc_and_delete(server):
     assert not server.documents.exists(path=pytest.ws_python_tests_path)
 
 
+def test_create_many(server):
+    parent = server.documents.create(
+        Document(name='many', type='Folder', properties={'dc:title': 'many'}),
+        parent_path=pytest.ws_root_path)
+    try:
+        docs = [Document(name='doc{}'.format(idx), type='Note',
+                         properties={'dc:title': 'doc{}'.format(idx)})
+                for idx in range(5)]
+        docs.insert(2, Document(name='alien', type='Alien'))
+        with SwapAttr(server.documents, 'max_in_flight', 2):
+            assert server.documents.max_in_flight == 2
+            results = server.documents.create_many(
+                docs, parent_id=parent.uid, workers=3)
+        assert not server.documents.max_in_flight
+
+        assert len(results) == 6
+        assert isinstance(results[2], HTTPError)
+        created = [res for res in results if isinstance(res, Document)]
+        assert [doc.title for doc in created] == [
+            'doc{}'.format(idx) for idx in range(5)]
+        assert len(server.documents.get_children(uid=parent.uid)) == 5
+    finally:
+        parent.delete()
+
+
 def test_create_doc_with_space_and_delete(server):
     doc = Document(
         name='my domain',
@@ -149,6 +176,105 @@ def test_create_doc_with_space_and_delete(server):
         doc.delete()
 
 
+def test_document_cache(server):
+    with SwapAttr(server.documents, 'cache', DocumentCache()):
+        with Doc(server) as doc:
+            cached = server.documents.get(uid=doc.uid)
+            assert server.documents.get(uid=doc.uid).uid == doc.uid
+            assert server.documents.get(path=doc.path).uid == doc.uid
+            assert server.documents.cache.stats['hits'] == 2
+
+            # Unsaved changes are not shared with other callers
+            cached.properties['dc:title'] = 'unsaved'
+            assert server.documents.get(uid=doc.uid).title == 'bar.txt'
+            other = server.documents.get(uid=doc.uid)
+            assert other.properties['dc:title'] == 'bar.txt'
+
+            cached.set({'dc:title': 'foo'})
+            cached.save()
+            assert server.documents.get(uid=doc.uid).title == 'foo'
+        assert not server.documents.cache.get(
+            uid=doc.uid, scope=server.documents._scope)
+
+
+def test_document_cache_load(server):
+    with SwapAttr(server.documents, 'cache', DocumentCache()):
+        with Doc(server) as doc:
+            cached = server.documents.get(uid=doc.uid)
+            cached.properties['dc:title'] = 'unsaved'
+
+            # Reloading fetches the server state, not the cached one
+            cached.load()
+            assert cached.properties['dc:title'] == 'bar.txt'
+            assert not cached.properties.dirty
+            cached.save()
+            assert server.documents.get(uid=doc.uid).title == 'bar.txt'
+
+            cached.properties['dc:title'] = 'saved'
+            cached.save()
+            cached.load()
+            assert cached.properties['dc:title'] == 'saved'
+
+
+def test_path_cache(server):
+    with SwapAttr(server.documents, 'path_cache', PathCache()):
+        with Doc(server) as doc:
+            cache = server.documents.path_cache
+            repository = server.client.repository
+            server.documents.get(uid=doc.uid)
+            assert cache.get(doc.path, scope=repository) == doc.uid
+            assert not cache.get(doc.path, scope='other-repository')
+
+            # A path left stale by another client falls back to the path
+            cache.add(doc.path, 'alien', scope=repository)
+            assert server.documents.get(path=doc.path).uid == doc.uid
+            assert cache.get(doc.path, scope=repository) == doc.uid
+
+            # Even when the cached uid is now the one of another document
+            root = server.documents.get(path=pytest.ws_root_path)
+            cache.add(doc.path, root.uid, scope=repository)
+            assert server.documents.get(path=doc.path).uid == doc.uid
+
+            # Moving a folder forgets the paths below it
+            server.documents.move(doc.uid, pytest.ws_root_path, name='moved')
+            assert not cache.get(doc.path, scope=repository)
+
+
+def test_get_projection(server):
+    with SwapAttr(server.documents, 'cache', DocumentCache()):
+        with Doc(server) as doc:
+            partial = server.documents.get(
+                uid=doc.uid, schemas=['dublincore'], fetch=['lock'])
+            assert 'dc:title' in partial.properties
+            assert not any(key.startswith('file:')
+                           for key in partial.properties)
+
+            # Partial documents are not cached
+            assert not server.documents.cache.get(
+                uid=doc.uid, scope=server.documents._scope)
+
+            children = server.documents.get_children(
+                path=pytest.ws_root_path, schemas='dublincore')
+            assert all('dc:title' in child.properties for child in children)
+
+
+def test_fetch_context(server):
+    with Doc(server) as doc:
+        doc.lock()
+        try:
+            res = server.documents.fetch_context(
+                doc.uid, enrichers=['acls', 'permissions'], fetch=['lock'])
+            assert res['uid'] == doc.uid
+            assert res['lockOwner'] == 'Administrator'
+            assert res['contextParameters']['acls']
+            assert 'Write' in res['contextParameters']['permissions']
+        finally:
+            doc.unlock()
+
+    # The endpoint headers are left untouched
+    assert 'fetch-document' not in server.documents.headers
+
+
 def test_fetch_acls(server):
     with Doc(server) as doc:
         acls = doc.fetch_acls()
@@ -186,6 +312,31 @@ def test_fetch_non_existing(server):
     assert not server.documents.exists(path='/zone51')
 
 
+def test_exists_many(server):
+    server.documents.missing_cache.clear()
+    with Doc(server) as doc:
+        uids = [doc.uid, 'alien', doc.uid]
+        res = server.documents.exists_many(uids)
+        assert list(res.items()) == [(doc.uid, True), ('alien', False)]
+
+        # Missing documents are remembered for a short time
+        assert server.documents._missing_key('alien') in (
+            server.documents.missing_cache)
+        assert not server.documents.exists(uid='alien')
+
+    # Operations may create documents known to be missing
+    path = pytest.ws_root_path + '/created-by-operation'
+    assert not server.documents.exists(path=path)
+    created = server.operations.execute(
+        command='Document.Create', input_obj=pytest.ws_root_path,
+        params={'type': 'File', 'name': 'created-by-operation',
+                'properties': {'dc:title': 'created-by-operation'}})
+    try:
+        assert server.documents.exists(path=path)
+    finally:
+        server.documents.delete(created['uid'])
+
+
 def test_fetch_rendition(server):
     with Doc(server, with_blob=True) as doc:
         res = doc.fetch_rendition('xmlExport')
@@ -207,12 +358,38 @@ def test_fetch_root(server):
     assert isinstance(root, Document)
 
 
+def test_get_many(server):
+    missing_uid = '00000000-0000-0000-0000-000000000000'
+    with Doc(server) as doc:
+        root = server.documents.get(path='/')
+        uids = [doc.uid, missing_uid, root.uid]
+        docs, missing = server.documents.get_many(uids, chunk=1, workers=2)
+        assert [d.uid for d in docs] == [doc.uid, root.uid]
+        assert all(isinstance(d, Document) for d in docs)
+        assert missing == [missing_uid]
+
+
 def test_has_permission(server):
     with Doc(server) as doc:
         assert doc.has_permission('Write')
         assert not doc.has_permission('Foo')
 
 
+def test_has_permission_cache(server):
+    cache = LRUCache(ttl=60)
+    with SwapAttr(server.documents, 'permissions_cache', cache):
+        with Doc(server) as doc:
+            assert doc.has_permission('Write')
+            assert doc.has_permission('Write')
+            assert not doc.has_permission('Foo')
+            assert cache.stats['hits'] == 2
+
+            # Permissions changes empty the cache
+            doc.add_permission({'permission': 'ReadWrite',
+                                'username': 'members'})
+            assert not len(cache)
+
+
 def test_locking(server):
     with Doc(server) as doc:
         assert not doc.fetch_lock_status()
@@ -298,6 +475,32 @@ def test_query(server):
     assert isinstance(docs['entries'][0], Document)
 
 
+def test_query_columns(server):
+    with Doc(server) as doc:
+        query = "SELECT * FROM Document WHERE ecm:uuid = '{}'".format(doc.uid)
+        columns = server.documents.query_columns(
+            query, ['ecm:uuid', 'dc:title'])
+        assert len(columns) == 1
+        assert list(columns['ecm:uuid']) == [doc.uid]
+        assert list(columns['dc:title']) == ['bar.txt']
+
+
+def test_query_rows(server):
+    with Doc(server) as doc:
+        query = ("SELECT ecm:uuid, dc:title FROM Document"
+                 " WHERE ecm:uuid = '{}'".format(doc.uid))
+        rows = list(server.documents.query_rows(query, page_size=1))
+        assert len(rows) == 1
+        assert rows[0].ecm_uuid == doc.uid
+        assert rows[0].dc_title == 'bar.txt'
+        assert rows[0] == (doc.uid, 'bar.txt')
+
+
+def test_query_rows_select_all(server):
+    with pytest.raises(BadQuery):
+        next(server.documents.query_rows('SELECT * FROM Document'))
+
+
 def test_query_missing_args(server):
     with pytest.raises(BadQuery):
         server.documents.query({})
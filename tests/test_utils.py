@@ -1,10 +1,17 @@
 # coding: utf-8
 from __future__ import unicode_literals
 import sys
+import threading
 
 import pytest
 
-from nuxeo.utils import SwapAttr, get_digester, guess_mimetype
+from nuxeo.utils import (SingleFlight, SwapAttr, chunks, get_digester,
+                         guess_mimetype, nxql_quote, parallel_map)
+
+
+def test_chunks():
+    assert list(chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert not list(chunks([], 2))
 
 
 @pytest.mark.parametrize('hash, digester', [
@@ -33,3 +40,56 @@ def test_guess_mimetype():
 
     with SwapAttr(sys, 'platform', 'win32'):
         assert guess_mimetype('foo.ppt')
+
+
+def test_nxql_quote():
+    assert nxql_quote('foo') == "'foo'"
+    assert nxql_quote("l'eau") == "'l\\'eau'"
+
+
+def test_parallel_map():
+    items = list(range(20))
+    assert parallel_map(lambda x: x * 2, items, workers=4) == [
+        x * 2 for x in items]
+
+
+def test_single_flight():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait()
+        return {'foo': 'bar'}
+
+    results = []
+    threads = [threading.Thread(
+        target=lambda: results.append(flight.do('key', fetch)))
+        for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.saved < 4:
+        release.wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert flight.saved == 4
+    assert results == [{'foo': 'bar'}] * 5
+    assert all(result is results[0] for result in results)
+
+    # Once done, the next call is a new one
+    assert flight.do('key', lambda: 42) == 42
+
+
+def test_single_flight_error():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError('test')
+
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert not flight._calls